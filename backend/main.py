@@ -3,55 +3,64 @@ New Homes Lead Tracker API
 FastAPI backend with CINC integration
 """
 
-from fastapi import FastAPI, HTTPException, Depends, status
+from fastapi import FastAPI, HTTPException, Depends, BackgroundTasks, Query, status
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse
+from fastapi.responses import ORJSONResponse, Response, StreamingResponse
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
-from pydantic import BaseModel, EmailStr, Field, field_validator, model_validator
-from typing import Optional, List
+from starlette.concurrency import run_in_threadpool
+from pydantic import BaseModel, EmailStr, Field, StringConstraints, field_validator, model_validator
+from typing import Annotated, Optional, List
 from datetime import datetime, timedelta, timezone
 from enum import Enum
 from jose import JWTError, jwt
 from passlib.context import CryptContext
+from cachetools import TTLCache
 import sqlite3
-import requests
-import csv
-import io
+import base64
+import httpx
+import orjson
+import hashlib
+import hmac
 import os
+import queue
 import re
+import threading
+import time
 import uuid
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import contextmanager, asynccontextmanager
+from functools import lru_cache
 from collections import defaultdict
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Application lifespan events"""
-    # Startup: Initialize database only if tables don't exist
-    with get_db() as conn:
-        cursor = conn.cursor()
-        # Check if visitors table exists
-        table_check = cursor.execute(
-            "SELECT name FROM sqlite_master WHERE type='table' AND name='visitors'"
-        ).fetchone()
-
-        if not table_check:
-            # Database is empty, run schema
-            print("Initializing database schema...")
-            with open("schema.sql", "r") as f:
-                conn.executescript(f.read())
-            print("Database schema initialized successfully")
-        else:
-            print("Database already initialized")
+    # Startup: Apply schema only when the database is behind SCHEMA_VERSION
+    apply_schema()
 
     # Initialize super admin
     initialize_super_admin()
 
+    # Shared HTTP client so webhook calls reuse keep-alive connections and TLS sessions
+    app.state.http = httpx.AsyncClient(
+        timeout=10.0,
+        limits=httpx.Limits(max_keepalive_connections=20)
+    )
+
     yield  # Application runs
 
-    # Shutdown: Add any cleanup here if needed
+    # Shutdown: close the HTTP client and pooled database connections
+    await app.state.http.aclose()
+    READ_POOL.close()
+    WRITE_POOL.close()
     print("Application shutting down")
 
-app = FastAPI(title="New Homes Lead Tracker", version="1.0.0", lifespan=lifespan)
+app = FastAPI(
+    title="New Homes Lead Tracker",
+    version="1.0.0",
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse
+)
 
 # CORS for frontend access
 app.add_middleware(
@@ -64,6 +73,27 @@ app.add_middleware(
 
 # Configuration
 DATABASE_PATH = os.getenv("DATABASE_PATH", "leads.db")
+
+# Schema is read once at import; bump SCHEMA_VERSION together with the
+# PRAGMA user_version at the end of schema.sql whenever the schema changes
+SCHEMA_VERSION = 5
+with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), "schema.sql"), "r") as f:
+    SCHEMA_SQL = f.read()
+
+def split_sql_script(script: str) -> List[str]:
+    """Split a SQL script into single statements, keeping trigger bodies whole"""
+    statements = []
+    current = ""
+    for line in script.splitlines(keepends=True):
+        current += line
+        if sqlite3.complete_statement(current):
+            statements.append(current.strip())
+            current = ""
+    return statements
+
+# Run one by one rather than through executescript(), which commits the
+# caller's transaction before it starts
+SCHEMA_STATEMENTS = split_sql_script(SCHEMA_SQL)
 ZAPIER_WEBHOOK_URL = os.getenv("ZAPIER_WEBHOOK_URL", "")  # Zapier webhook for lead sync
 
 # Security Configuration
@@ -76,25 +106,195 @@ SUPER_ADMIN_USERNAME = os.getenv("SUPER_ADMIN_USERNAME", "superadmin")
 SUPER_ADMIN_PASSWORD = os.getenv("SUPER_ADMIN_PASSWORD", "ChangeMeOnFirstLogin123!")
 SUPER_ADMIN_EMAIL = os.getenv("SUPER_ADMIN_EMAIL", "admin@example.com")
 
-# Password hashing
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Password hashing - argon2id for new hashes; existing bcrypt hashes still verify
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+
+@lru_cache(maxsize=1)
+def get_pwd_context() -> CryptContext:
+    """Build the password hashing context on first use rather than at import"""
+    return CryptContext(
+        schemes=["argon2", "bcrypt"],
+        deprecated="auto",
+        argon2__type="ID",
+        argon2__time_cost=2,
+        argon2__memory_cost=19456,
+        bcrypt__rounds=BCRYPT_ROUNDS
+    )
 
 # OAuth2 scheme
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="login")
 
+# Validated tokens -> (UserInDB, valid_until) so repeat requests skip the JWT
+# verify and users lookup. valid_until is the token's exp, capped at when the
+# user row behind it expires from _user_cache, so a token entry never outlives
+# the lookup it was built from. Entries live at most TOKEN_CACHE_TTL seconds.
+TOKEN_CACHE_TTL = 30
+_token_cache = TTLCache(maxsize=10_000, ttl=TOKEN_CACHE_TTL)
+_token_cache_lock = threading.Lock()
+
+# Active users by username -> (UserInDB, loaded_at), so a new token for a
+# recently seen user (a fresh login) still skips the users lookup.
+#
+# Both caches are per process. Invalidation below only reaches the worker that
+# made the change; other workers keep accepting a deactivated or demoted user
+# until their copy of the row expires, at most USER_CACHE_TTL seconds after
+# they read it.
+USER_CACHE_TTL = 60
+_user_cache = TTLCache(maxsize=1024, ttl=USER_CACHE_TTL)
+_user_cache_lock = threading.Lock()
+
+# Both caches key on this generation; bumping it when a user is modified
+# orphans every older entry, including ones a request still in flight stores
+# after the bump.
+_user_cache_generation = 0
+
+# Recent successful logins: HMAC(username:password) -> the password_hash it
+# verified against. A repeat login with the same credentials skips the slow
+# hash verify while the stored hash is unchanged; the plaintext is never kept.
+LOGIN_CACHE_TTL = 60
+_login_cache = TTLCache(maxsize=10_000, ttl=LOGIN_CACHE_TTL)
+_login_cache_lock = threading.Lock()
+
+# SQLite tuning applied once per connection: WAL lets readers run alongside a
+# writer, synchronous=NORMAL skips the per-commit fsync (safe under WAL), a
+# ~20MB page cache keeps hot pages in memory between queries, and mmap lets
+# reads come straight from the OS page cache shared by every connection.
+SQLITE_PRAGMAS = """
+    PRAGMA journal_mode = WAL;
+    PRAGMA synchronous = NORMAL;
+    PRAGMA busy_timeout = 5000;
+    PRAGMA cache_size = -20000;
+    PRAGMA mmap_size = 268435456;
+    PRAGMA temp_store = MEMORY;
+    PRAGMA foreign_keys = ON;
+"""
+
+def connect_db(readonly: bool = False) -> sqlite3.Connection:
+    """Open a SQLite connection with the standard PRAGMAs applied"""
+    # Pooled connections live for the whole process, so give the prepared
+    # statement cache room for every distinct query the API issues
+    conn = sqlite3.connect(DATABASE_PATH, check_same_thread=False, cached_statements=256)
+    conn.executescript(SQLITE_PRAGMAS)
+    if readonly:
+        conn.execute("PRAGMA query_only = ON")
+    conn.row_factory = sqlite3.Row
+    return conn
+
+# Seconds a request waits for a pooled connection before giving up with a 503
+POOL_ACQUIRE_TIMEOUT = 10
+
+class ConnectionPool:
+    """
+    Bounded pool of long-lived SQLite connections.
+    Connections are opened lazily up to `size` and reused across requests so
+    the PRAGMAs and page cache survive between queries.
+    """
+
+    def __init__(self, size: int, readonly: bool = False):
+        self.size = size
+        self.readonly = readonly
+        self._idle: queue.LifoQueue = queue.LifoQueue(maxsize=size)
+        self._opened = 0
+        self._lock = threading.Lock()
+
+    def acquire(self) -> sqlite3.Connection:
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            can_open = self._opened < self.size
+            if can_open:
+                self._opened += 1
+
+        if not can_open:
+            # Pool is at capacity - wait for a connection to be released, but
+            # answer 503 rather than hang the request if none frees up
+            try:
+                return self._idle.get(timeout=POOL_ACQUIRE_TIMEOUT)
+            except queue.Empty:
+                raise HTTPException(status_code=503, detail="Database busy, please retry")
+
+        try:
+            return connect_db(readonly=self.readonly)
+        except Exception:
+            with self._lock:
+                self._opened -= 1
+            raise
+
+    def release(self, conn: sqlite3.Connection):
+        self._idle.put_nowait(conn)
+
+    def discard(self, conn: sqlite3.Connection):
+        """Close a broken connection; a replacement is opened on next acquire"""
+        try:
+            conn.close()
+        finally:
+            with self._lock:
+                self._opened -= 1
+
+    def close(self):
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self.discard(conn)
+
+# SQLite allows a single writer, so writes share one connection while reads
+# fan out across a connection per CPU.
+READ_POOL = ConnectionPool(size=os.cpu_count() or 4, readonly=True)
+WRITE_POOL = ConnectionPool(size=1)
+
 # Database connection manager
 @contextmanager
-def get_db():
-    conn = sqlite3.connect(DATABASE_PATH)
-    conn.row_factory = sqlite3.Row
+def get_db(readonly: bool = False):
+    pool = READ_POOL if readonly else WRITE_POOL
+    conn = pool.acquire()
+    healthy = True
     try:
+        if not readonly:
+            # Take the write lock up front so the whole block commits as one
+            # transaction and never has to upgrade a read lock mid-statement
+            conn.execute("BEGIN IMMEDIATE")
         yield conn
         conn.commit()
-    except Exception as e:
-        conn.rollback()
-        raise e
+    except sqlite3.Error:
+        healthy = False
+        raise
     finally:
-        conn.close()
+        # Roll back anything left open (HTTPException, client disconnect
+        # mid-stream, ...) before the connection goes back to the pool
+        if healthy and conn.in_transaction:
+            try:
+                conn.rollback()
+            except sqlite3.Error:
+                healthy = False
+        if healthy:
+            pool.release(conn)
+        else:
+            pool.discard(conn)
+
+def apply_schema():
+    """Apply schema.sql if the database is behind SCHEMA_VERSION.
+
+    The version check and the apply share get_db's BEGIN IMMEDIATE
+    transaction, so when several workers start together only the first applies
+    the schema and the rest see the new version once they get the lock. Every
+    statement is IF [NOT] EXISTS, so older databases pick up new indexes.
+    """
+    with get_db() as conn:
+        current_version = conn.execute("PRAGMA user_version").fetchone()[0]
+        if current_version < SCHEMA_VERSION:
+            print(f"Applying database schema (version {current_version} -> {SCHEMA_VERSION})...")
+            for statement in SCHEMA_STATEMENTS:
+                conn.execute(statement)
+            # Refresh planner statistics so the indexes are costed correctly
+            conn.execute("ANALYZE")
+            print("Database schema applied successfully")
+        else:
+            print("Database schema up to date")
 
 # Validation Enums
 class UserRole(str, Enum):
@@ -102,6 +302,10 @@ class UserRole(str, Enum):
     ADMIN = "admin"
     USER = "user"
 
+# Role sets for membership checks
+VALID_ROLES = frozenset(role.value for role in UserRole)
+ADMIN_ROLES = frozenset({UserRole.ADMIN.value, UserRole.SUPER_ADMIN.value})
+
 class PurchaseTimeline(str, Enum):
     ZERO_TO_THREE = "0-3 months"
     THREE_TO_SIX = "3-6 months"
@@ -153,29 +357,49 @@ class SortOrder(str, Enum):
     ASC = "asc"
     DESC = "desc"
 
+# Columns the visitor table in the dashboard renders. Naming them (rather than
+# SELECT *) keeps the view's note_count/latest_note subqueries from running
+# for every listed row.
+VISITOR_LIST_COLUMNS = """
+    id, created_at, updated_at, buyer_name, buyer_phone, buyer_email,
+    purchase_timeline, price_range, site, capturing_agent_id,
+    created_by_user_id, created_by_username, agent_name, represented,
+    cobroker_name, cinc_synced
+"""
+
+# Validation patterns, compiled once at import
+NON_DIGIT_RE = re.compile(r'\D')
+USERNAME_PATTERN = r'^[a-zA-Z0-9_-]+$'
+HAS_LETTER_RE = re.compile(r'[A-Za-z]')
+HAS_DIGIT_RE = re.compile(r'[0-9]')
+
 # Helper Functions for Validation
 def validate_phone_number(phone: str) -> str:
     """Validate and normalize phone number"""
     if not phone:
         return phone
     # Remove all non-digit characters
-    cleaned = re.sub(r'\D', '', phone)
+    cleaned = NON_DIGIT_RE.sub('', phone)
     if len(cleaned) < 10:
         raise ValueError("Phone number must be at least 10 digits")
     return cleaned
 
-def sanitize_string(value: str, max_length: int = 255) -> str:
-    """Sanitize string input"""
-    if not value:
-        return value
-    # Remove leading/trailing whitespace
-    cleaned = value.strip()
-    # Limit length
-    if len(cleaned) > max_length:
-        raise ValueError(f"Input exceeds maximum length of {max_length} characters")
-    return cleaned
+def validate_password_strength(password: str) -> str:
+    """Require at least 8 characters with a letter and a number"""
+    if len(password) < 8:
+        raise ValueError('Password must be at least 8 characters')
+    if not HAS_LETTER_RE.search(password):
+        raise ValueError('Password must contain at least one letter')
+    if not HAS_DIGIT_RE.search(password):
+        raise ValueError('Password must contain at least one number')
+    return password
 
 # Pydantic Models
+# Free-text input: surrounding whitespace is trimmed in pydantic-core before
+# the field's min/max length is checked
+StrippedStr = Annotated[str, StringConstraints(strip_whitespace=True)]
+Username = Annotated[str, StringConstraints(min_length=3, max_length=50, pattern=USERNAME_PATTERN, to_lower=True)]
+
 class Token(BaseModel):
     access_token: str
     token_type: str
@@ -191,29 +415,16 @@ class UserInDB(BaseModel):
     active: bool
 
 class UserCreate(BaseModel):
-    username: str = Field(..., min_length=3, max_length=50, pattern="^[a-zA-Z0-9_-]+$")
+    username: Username
     password: str = Field(..., min_length=8, max_length=100)
     email: Optional[EmailStr] = None
     role: UserRole
     agent_id: Optional[int] = Field(None, gt=0)
 
-    @field_validator('username')
-    @classmethod
-    def username_alphanumeric(cls, v):
-        if not re.match(r'^[a-zA-Z0-9_-]+$', v):
-            raise ValueError('Username must contain only letters, numbers, underscores, and hyphens')
-        return v.lower()
-
     @field_validator('password')
     @classmethod
     def password_strength(cls, v):
-        if len(v) < 8:
-            raise ValueError('Password must be at least 8 characters')
-        if not re.search(r'[A-Za-z]', v):
-            raise ValueError('Password must contain at least one letter')
-        if not re.search(r'[0-9]', v):
-            raise ValueError('Password must contain at least one number')
-        return v
+        return validate_password_strength(v)
 
 class UserUpdate(BaseModel):
     email: Optional[EmailStr] = None
@@ -227,13 +438,7 @@ class UserUpdate(BaseModel):
     def password_strength(cls, v):
         if v is None:
             return v
-        if len(v) < 8:
-            raise ValueError('Password must be at least 8 characters')
-        if not re.search(r'[A-Za-z]', v):
-            raise ValueError('Password must contain at least one letter')
-        if not re.search(r'[0-9]', v):
-            raise ValueError('Password must contain at least one number')
-        return v
+        return validate_password_strength(v)
 
 class ProfileUpdate(BaseModel):
     """Model for users updating their own profile"""
@@ -246,12 +451,12 @@ class PasswordChange(BaseModel):
 
 class VisitorCreate(BaseModel):
     # Required fields (always)
-    buyer_name: str = Field(..., min_length=2, max_length=255)
+    buyer_name: StrippedStr = Field(..., min_length=2, max_length=255)
     secondary_visitor: Optional[str] = Field(None, max_length=255)  # Optional secondary visitor name
     first_visit: bool = Field(...)
     represented: bool = Field(...)
     capturing_agent_id: Optional[int] = Field(None, gt=0)  # Optional - will be set from user's agent_id if not provided
-    site: str = Field(..., min_length=1, max_length=100)
+    site: StrippedStr = Field(..., min_length=1, max_length=100)
 
     # Conditionally required (*not required if represented)
     buyer_email: Optional[EmailStr] = None
@@ -264,15 +469,15 @@ class VisitorCreate(BaseModel):
     purchase_timeline: Optional[PurchaseTimeline] = None
 
     # Representation details
-    cobroker_name: Optional[str] = Field(None, max_length=255)
+    cobroker_name: Optional[StrippedStr] = Field(None, max_length=255)
 
     # Location
     is_local: Optional[bool] = True
-    buyer_state: Optional[str] = Field(None, max_length=50)
+    buyer_state: Optional[StrippedStr] = Field(None, max_length=50)
 
     # Occupation
     occupation: Optional[Occupation] = None
-    occupation_other: Optional[str] = Field(None, max_length=100)
+    occupation_other: Optional[StrippedStr] = Field(None, max_length=100)
 
     # Discovery method
     discovery_method: Optional[DiscoveryMethod] = None
@@ -285,18 +490,13 @@ class VisitorCreate(BaseModel):
     finalized_contracts: bool = False
 
     # Notes (updateable)
-    notes: Optional[str] = Field(None, max_length=5000)
+    notes: Optional[StrippedStr] = Field(None, max_length=5000)
 
     # Legacy fields (keeping for backward compatibility)
     price_range: Optional[PriceRange] = None
-    location_looking: Optional[str] = Field(None, max_length=255)
-    location_current: Optional[str] = Field(None, max_length=255)
-    agent_name: Optional[str] = Field(None, max_length=255)
-
-    @field_validator('buyer_name')
-    @classmethod
-    def validate_buyer_name(cls, v):
-        return sanitize_string(v, 255)
+    location_looking: Optional[StrippedStr] = Field(None, max_length=255)
+    location_current: Optional[StrippedStr] = Field(None, max_length=255)
+    agent_name: Optional[StrippedStr] = Field(None, max_length=255)
 
     @field_validator('buyer_phone')
     @classmethod
@@ -344,32 +544,18 @@ class VisitorCreate(BaseModel):
                     raise ValueError(f'Invalid builder option: {item}')
         return v
 
-    @field_validator('location_looking', 'location_current', 'agent_name', 'site', 'cobroker_name', 'buyer_state', 'occupation_other')
-    @classmethod
-    def validate_strings(cls, v):
-        if v is None:
-            return v
-        return sanitize_string(v, 255)
-
-    @field_validator('notes')
-    @classmethod
-    def validate_notes(cls, v):
-        if v is None:
-            return v
-        return sanitize_string(v, 5000)
-
 class VisitorUpdate(BaseModel):
-    buyer_name: Optional[str] = Field(None, min_length=2, max_length=255)
+    buyer_name: Optional[StrippedStr] = Field(None, min_length=2, max_length=255)
     secondary_visitor: Optional[str] = Field(None, max_length=255)
     buyer_email: Optional[EmailStr] = None
     buyer_phone: Optional[str] = Field(None, min_length=10, max_length=20)
     first_visit: Optional[bool] = None
     represented: Optional[bool] = None
-    cobroker_name: Optional[str] = Field(None, max_length=255)
+    cobroker_name: Optional[StrippedStr] = Field(None, max_length=255)
     is_local: Optional[bool] = None
-    buyer_state: Optional[str] = Field(None, max_length=50)
+    buyer_state: Optional[StrippedStr] = Field(None, max_length=50)
     occupation: Optional[Occupation] = None
-    occupation_other: Optional[str] = Field(None, max_length=100)
+    occupation_other: Optional[StrippedStr] = Field(None, max_length=100)
     discovery_method: Optional[DiscoveryMethod] = None
     interested_in: Optional[List[str]] = None
     builders_requested: Optional[List[str]] = None
@@ -377,16 +563,9 @@ class VisitorUpdate(BaseModel):
     offer_on_table: Optional[bool] = None
     finalized_contracts: Optional[bool] = None
     price_range: Optional[PriceRange] = None
-    location_looking: Optional[str] = Field(None, max_length=255)
-    location_current: Optional[str] = Field(None, max_length=255)
-    site: Optional[str] = Field(None, min_length=1, max_length=100)
-
-    @field_validator('buyer_name')
-    @classmethod
-    def validate_buyer_name(cls, v):
-        if v is None:
-            return v
-        return sanitize_string(v, 255)
+    location_looking: Optional[StrippedStr] = Field(None, max_length=255)
+    location_current: Optional[StrippedStr] = Field(None, max_length=255)
+    site: Optional[StrippedStr] = Field(None, min_length=1, max_length=100)
 
     @field_validator('buyer_phone')
     @classmethod
@@ -415,35 +594,18 @@ class VisitorUpdate(BaseModel):
                     raise ValueError(f'Invalid builder option: {item}')
         return v
 
-    @field_validator('location_looking', 'location_current', 'site', 'cobroker_name', 'buyer_state', 'occupation_other')
-    @classmethod
-    def validate_strings(cls, v):
-        if v is None:
-            return v
-        return sanitize_string(v, 255)
-
 class NoteCreate(BaseModel):
     visitor_id: int = Field(..., gt=0)
     agent_id: int = Field(..., gt=0)
-    note: str = Field(..., min_length=1, max_length=2000)
-
-    @field_validator('note')
-    @classmethod
-    def validate_note(cls, v):
-        return sanitize_string(v, 2000)
+    note: StrippedStr = Field(..., min_length=1, max_length=2000)
 
 class AgentCreate(BaseModel):
-    name: str = Field(..., min_length=2, max_length=255)
+    name: StrippedStr = Field(..., min_length=2, max_length=255)
     cinc_id: str = Field(..., min_length=1, max_length=50)
-    site: str = Field(..., min_length=1, max_length=100)
+    site: StrippedStr = Field(..., min_length=1, max_length=100)
     email: Optional[EmailStr] = None
     phone: Optional[str] = Field(None, max_length=20)
 
-    @field_validator('name', 'site')
-    @classmethod
-    def validate_strings(cls, v):
-        return sanitize_string(v, 255)
-
     @field_validator('phone')
     @classmethod
     def validate_phone(cls, v):
@@ -479,11 +641,20 @@ class PaginatedResponse(BaseModel):
 # Authentication Helper Functions
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verify password against hash"""
-    return pwd_context.verify(plain_password, hashed_password)
+    return get_pwd_context().verify(plain_password, hashed_password)
 
 def get_password_hash(password: str) -> str:
     """Hash password"""
-    return pwd_context.hash(password)
+    return get_pwd_context().hash(password)
+
+@lru_cache(maxsize=1)
+def get_dummy_password_hash() -> str:
+    """Hash verified against when the username is unknown, so misses cost the same as hits"""
+    return get_password_hash(uuid.uuid4().hex)
+
+def _now_iso() -> str:
+    """Current UTC time as an ISO 8601 string"""
+    return datetime.now(timezone.utc).isoformat()
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     """Create JWT access token"""
@@ -498,32 +669,73 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
 
 def authenticate_user(username: str, password: str) -> Optional[dict]:
     """Authenticate user and return user data"""
-    with get_db() as conn:
-        cursor = conn.cursor()
-        user = cursor.execute(
+    with get_db(readonly=True) as conn:
+        user = conn.execute(
             "SELECT id, username, password_hash, role, agent_id, active FROM users WHERE username = ? AND active = 1",
             (username,)
         ).fetchone()
 
-        if not user:
+    if not user:
+        # Burn the same hashing time as a real check to avoid leaking which usernames exist
+        verify_password(password, get_dummy_password_hash())
+        return None
+
+    login_key = hmac.new(
+        SECRET_KEY.encode(), f"{username}:{password}".encode(), hashlib.sha256
+    ).digest()
+    with _login_cache_lock:
+        verified_hash = _login_cache.get(login_key)
+
+    # A changed password_hash never matches, so password updates need no invalidation
+    new_hash = None
+    if verified_hash is None or not hmac.compare_digest(verified_hash, user["password_hash"]):
+        # Verify outside any transaction so the write lock is never held while hashing.
+        # Legacy bcrypt (or outdated cost) hashes come back re-hashed with the current scheme.
+        valid, new_hash = get_pwd_context().verify_and_update(password, user["password_hash"])
+        if not valid:
             return None
+        with _login_cache_lock:
+            _login_cache[login_key] = new_hash or user["password_hash"]
 
-        if not verify_password(password, user["password_hash"]):
-            return None
+    # Update last login, storing the upgraded hash if there is one
+    with get_db() as conn:
+        if new_hash:
+            conn.execute(
+                "UPDATE users SET last_login = ?, password_hash = ? WHERE id = ?",
+                (_now_iso(), new_hash, user["id"])
+            )
+        else:
+            conn.execute(
+                "UPDATE users SET last_login = ? WHERE id = ?",
+                (_now_iso(), user["id"])
+            )
 
-        # Update last login
-        cursor.execute(
-            "UPDATE users SET last_login = ? WHERE id = ?",
-            (datetime.now(timezone.utc).isoformat(), user["id"])
-        )
+    return {
+        "id": user["id"],
+        "username": user["username"],
+        "role": user["role"],
+        "agent_id": user["agent_id"],
+        "active": user["active"]
+    }
+
+def load_active_user(username: str) -> Optional[UserInDB]:
+    """Load an active user by username, or None if missing/deactivated"""
+    with get_db(readonly=True) as conn:
+        user = conn.execute(
+            "SELECT id, username, role, agent_id, active FROM users WHERE username = ? AND active = 1",
+            (username,)
+        ).fetchone()
 
-        return {
-            "id": user["id"],
-            "username": user["username"],
-            "role": user["role"],
-            "agent_id": user["agent_id"],
-            "active": user["active"]
-        }
+    if user is None:
+        return None
+
+    return UserInDB(
+        id=user["id"],
+        username=user["username"],
+        role=user["role"],
+        agent_id=user["agent_id"],
+        active=user["active"]
+    )
 
 async def get_current_user(token: str = Depends(oauth2_scheme)) -> UserInDB:
     """Get current authenticated user from JWT token"""
@@ -532,6 +744,15 @@ async def get_current_user(token: str = Depends(oauth2_scheme)) -> UserInDB:
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
+    generation = _user_cache_generation
+    cache_key = (generation, hashlib.blake2b(token.encode(), digest_size=16).digest())
+    with _token_cache_lock:
+        cached = _token_cache.get(cache_key)
+    if cached is not None:
+        cached_user, valid_until = cached
+        if time.time() < valid_until:
+            return cached_user
+
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         username: str = payload.get("sub")
@@ -540,27 +761,35 @@ async def get_current_user(token: str = Depends(oauth2_scheme)) -> UserInDB:
     except JWTError:
         raise credentials_exception
 
-    with get_db() as conn:
-        cursor = conn.cursor()
-        user = cursor.execute(
-            "SELECT id, username, role, agent_id, active FROM users WHERE username = ? AND active = 1",
-            (username,)
-        ).fetchone()
+    with _user_cache_lock:
+        cached = _user_cache.get((generation, username))
 
-        if user is None:
+    if cached is not None:
+        current_user, loaded_at = cached
+    else:
+        # Blocking SQLite read, kept off the event loop
+        loaded_at = time.time()
+        current_user = await run_in_threadpool(load_active_user, username)
+        if current_user is None:
             raise credentials_exception
 
-        return UserInDB(
-            id=user["id"],
-            username=user["username"],
-            role=user["role"],
-            agent_id=user["agent_id"],
-            active=user["active"]
-        )
+        with _user_cache_lock:
+            _user_cache[(generation, username)] = (current_user, loaded_at)
+
+    with _token_cache_lock:
+        _token_cache[cache_key] = (current_user, min(payload["exp"], loaded_at + USER_CACHE_TTL))
+
+    return current_user
+
+def invalidate_user_caches():
+    """Orphan this worker's cached lookups after a user's role/agent/active state changes"""
+    global _user_cache_generation
+    with _token_cache_lock:
+        _user_cache_generation += 1
 
 async def get_current_admin_user(current_user: UserInDB = Depends(get_current_user)) -> UserInDB:
     """Verify current user is admin or super_admin"""
-    if current_user.role not in ["admin", "super_admin"]:
+    if current_user.role not in ADMIN_ROLES:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Not enough permissions"
@@ -577,24 +806,137 @@ async def get_current_super_admin_user(current_user: UserInDB = Depends(get_curr
     return current_user
 
 # Helper Functions
+def rows_to_dicts(cursor: sqlite3.Cursor, rows: List[sqlite3.Row]) -> List[dict]:
+    """Convert result rows to dicts, resolving the column names once per result set"""
+    columns = [desc[0] for desc in cursor.description]
+    return [dict(zip(columns, row)) for row in rows]
+
+def encode_page_cursor(sort_column: str, value, row_id: int) -> str:
+    """Encode the sort key of a page's last row as an opaque keyset cursor"""
+    return base64.urlsafe_b64encode(orjson.dumps([sort_column, value, row_id])).decode()
+
+def decode_page_cursor(page_cursor: str, sort_column: str) -> tuple:
+    """Decode a keyset cursor into (value, id), rejecting malformed or mismatched ones"""
+    try:
+        cursor_column, value, row_id = orjson.loads(base64.urlsafe_b64decode(page_cursor))
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if cursor_column != sort_column or not isinstance(row_id, int):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    # NULL is a valid boundary - imported visitors can lack created_at/updated_at
+    if value is not None and not isinstance(value, (str, int, float)):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return value, row_id
+
+def page_seek_segments(sort_column: str, sort_direction: str, value, row_id: int) -> List[tuple]:
+    """(condition, params) ranges holding the rows after a keyset cursor, in page order.
+
+    SQLite sorts NULLs first ascending and last descending, and a row-value
+    comparison against NULL matches nothing. The NULL-keyed rows are therefore
+    their own range, read only once the non-NULL range runs out. Each range
+    stays a plain index seek.
+    """
+    if sort_direction == "DESC":
+        if value is None:
+            return [(f"{sort_column} IS NULL AND id < ?", [row_id])]
+        return [(f"({sort_column}, id) < (?, ?)", [value, row_id]), (f"{sort_column} IS NULL", [])]
+    if value is None:
+        return [(f"{sort_column} IS NULL AND id > ?", [row_id]), (f"{sort_column} IS NOT NULL", [])]
+    return [(f"({sort_column}, id) > (?, ?)", [value, row_id])]
+
+# Filtered totals for keyset pages, keyed by WHERE clause + params. Page one
+# always recounts, so a stale total only shows while paging for 30 seconds.
+_visitor_count_cache = TTLCache(maxsize=1024, ttl=30)
+_visitor_count_cache_lock = threading.Lock()
+
+# Agents change rarely compared to lead capture - cache the sync fields for a
+# minute. Cleared by create_agent/update_agent/deactivate_agent.
+_agent_cache = TTLCache(maxsize=1024, ttl=60)
+_agent_cache_lock = threading.Lock()
+
+def get_agent(cursor, agent_id: int) -> Optional[dict]:
+    """Get agent id/name/cinc_id/email, served from a short-lived cache when possible"""
+    with _agent_cache_lock:
+        agent = _agent_cache.get(agent_id)
+    if agent is not None:
+        return agent
+
+    row = cursor.execute(
+        "SELECT id, name, cinc_id, email FROM agents WHERE id = ?",
+        (agent_id,)
+    ).fetchone()
+    if row is None:
+        return None
+
+    agent = dict(row)
+    with _agent_cache_lock:
+        _agent_cache[agent_id] = agent
+    return agent
+
+def invalidate_agent_cache(agent_id: int):
+    """Drop a cached agent after it is created or modified"""
+    with _agent_cache_lock:
+        _agent_cache.pop(agent_id, None)
+
+# /stats and /analytics responses keyed by (generation, endpoint, role, agent,
+# site) for 30 seconds. Visitor and agent writes bump the generation, so this
+# worker never serves numbers older than its own last write.
+DASHBOARD_CACHE_TTL = 30
+_dashboard_cache = TTLCache(maxsize=1024, ttl=DASHBOARD_CACHE_TTL)
+_dashboard_cache_lock = threading.Lock()
+_dashboard_cache_generation = 0
+
+def invalidate_dashboard_cache():
+    """Orphan cached dashboard aggregates after visitors or agents change"""
+    global _dashboard_cache_generation
+    with _dashboard_cache_lock:
+        _dashboard_cache_generation += 1
+
+def cached_dashboard(endpoint: str, current_user: UserInDB, site: Optional[str], compute):
+    """Return a cached dashboard aggregate, computing and storing it on a miss"""
+    cache_key = (_dashboard_cache_generation, endpoint, current_user.role, current_user.agent_id, site)
+    with _dashboard_cache_lock:
+        result = _dashboard_cache.get(cache_key)
+    if result is not None:
+        return result
+
+    result = compute()
+    with _dashboard_cache_lock:
+        _dashboard_cache[cache_key] = result
+    return result
+
+def fetch_column(conn: sqlite3.Connection, sql: str, params=()) -> list:
+    """Run a single-column query and return its values, skipping Row construction"""
+    cursor = conn.cursor()
+    cursor.row_factory = None
+    return [row[0] for row in cursor.execute(sql, params)]
+
+def get_agent_site_names(conn: sqlite3.Connection, agent_id: int) -> List[str]:
+    """Sites assigned to an agent, in name order"""
+    return fetch_column(
+        conn,
+        "SELECT site FROM agent_sites WHERE agent_id = ? ORDER BY site",
+        (agent_id,)
+    )
+
 def get_user_accessible_sites(cursor, user: UserInDB) -> List[str]:
     """
     Get list of sites accessible to a user based on their role.
     Returns all site names for admins, agent's assigned sites for regular users.
     """
-    if user.role in ["admin", "super_admin"]:
+    if user.role in ADMIN_ROLES:
         # Admins can access all sites
         return []  # Empty list means no filtering (all sites)
 
     # Regular users - get their agent's assigned sites
-    agent_sites = cursor.execute(
-        "SELECT site FROM agent_sites WHERE agent_id = ? ORDER BY site",
-        (user.agent_id,)
-    ).fetchall()
+    return get_agent_site_names(cursor.connection, user.agent_id)
 
-    return [s["site"] for s in agent_sites]
+def split_full_name(full_name: str) -> tuple[str, str]:
+    """Split a full name into (first, last) at the first space"""
+    first_name, _, last_name = full_name.strip().partition(" ")
+    return first_name, last_name.lstrip()
 
-def sync_to_zapier(visitor_data: dict, agent_data: dict) -> dict:
+async def sync_to_zapier(visitor: VisitorCreate, agent_data: dict, buyer_email: str, visit_date: str) -> dict:
     """
     Send lead data to Zapier webhook
     The webhook will handle forwarding to CINC or other systems
@@ -603,16 +945,11 @@ def sync_to_zapier(visitor_data: dict, agent_data: dict) -> dict:
         return {"success": False, "error": "Zapier webhook URL not configured"}
 
     try:
-        # Split name into first and last
-        name_parts = visitor_data["buyer_name"].split()
-        first_name = name_parts[0] if name_parts else ""
-        last_name = " ".join(name_parts[1:]) if len(name_parts) > 1 else ""
+        first_name, last_name = split_full_name(visitor.buyer_name)
 
         # Prepare comprehensive payload for Zapier
         # Use placeholder phone if none provided (some CRMs require phone number)
-        phone = visitor_data.get("buyer_phone", "")
-        if phone:
-            phone = phone.strip() if isinstance(phone, str) else str(phone)
+        phone = visitor.buyer_phone.strip() if visitor.buyer_phone else ""
         if not phone:
             phone = "5555555555"
 
@@ -622,66 +959,65 @@ def sync_to_zapier(visitor_data: dict, agent_data: dict) -> dict:
             # Buyer Information
             "firstName": first_name,
             "lastName": last_name,
-            "fullName": visitor_data["buyer_name"],
-            "email": visitor_data.get("buyer_email", ""),
+            "fullName": visitor.buyer_name,
+            "email": buyer_email,
             "phone": phone,
 
             # Agent Information
             "agentName": agent_data.get("name", ""),
             "agentEmail": agent_data.get("email", ""),
             "agentCincId": agent_data.get("cinc_id", ""),
-            "site": visitor_data["site"],
+            "site": visitor.site,
 
             # Visit Information
-            "firstVisit": "Yes" if visitor_data.get("first_visit") else "No",
-            "interestedIn": visitor_data.get("interested_in", []),
+            "firstVisit": "Yes" if visitor.first_visit else "No",
+            "interestedIn": visitor.interested_in,
 
             # Timeline & Details
-            "purchaseTimeline": visitor_data.get("purchase_timeline", ""),
-            "priceRange": visitor_data.get("price_range", ""),
+            "purchaseTimeline": visitor.purchase_timeline,
+            "priceRange": visitor.price_range,
 
             # Representation
-            "represented": "Yes" if visitor_data.get("represented") else "No",
-            "cobrokerName": visitor_data.get("cobroker_name", ""),
+            "represented": "Yes" if visitor.represented else "No",
+            "cobrokerName": visitor.cobroker_name,
 
             # Location
-            "isLocal": "Yes" if visitor_data.get("is_local") else "No",
-            "buyerState": visitor_data.get("buyer_state", ""),
+            "isLocal": "Yes" if visitor.is_local else "No",
+            "buyerState": visitor.buyer_state,
 
             # Occupation
-            "occupation": visitor_data.get("occupation", ""),
-            "occupationOther": visitor_data.get("occupation_other", ""),
+            "occupation": visitor.occupation,
+            "occupationOther": visitor.occupation_other,
 
             # Discovery
-            "discoveryMethod": visitor_data.get("discovery_method", ""),
+            "discoveryMethod": visitor.discovery_method,
 
             # Builder Preferences
-            "buildersRequested": visitor_data.get("builders_requested", []),
+            "buildersRequested": visitor.builders_requested,
 
             # Sales Status
-            "offerOnTable": "Yes" if visitor_data.get("offer_on_table") else "No",
-            "finalizedContracts": "Yes" if visitor_data.get("finalized_contracts") else "No",
+            "offerOnTable": "Yes" if visitor.offer_on_table else "No",
+            "finalizedContracts": "Yes" if visitor.finalized_contracts else "No",
 
             # Notes
-            "notes": visitor_data.get("notes", ""),
+            "notes": visitor.notes,
 
             # Legacy Fields (for backward compatibility)
-            "locationLooking": visitor_data.get("location_looking", ""),
-            "locationCurrent": visitor_data.get("location_current", ""),
-            "representingAgent": visitor_data.get("agent_name", ""),
+            "locationLooking": visitor.location_looking,
+            "locationCurrent": visitor.location_current,
+            "representingAgent": visitor.agent_name,
 
             # Metadata
             "source": "New Homes Lead Tracker",
-            "timestamp": datetime.now(timezone.utc).isoformat(),
-            "visitDate": visitor_data.get("created_at", datetime.now(timezone.utc).isoformat())
+            "timestamp": _now_iso(),
+            "visitDate": visit_date
         }
 
         # Send to Zapier webhook
-        response = requests.post(
+        response = await app.state.http.post(
             ZAPIER_WEBHOOK_URL,
-            json=payload,
-            headers={"Content-Type": "application/json"},
-            timeout=10
+            content=orjson.dumps(payload),
+            headers={"Content-Type": "application/json"}
         )
 
         response.raise_for_status()
@@ -689,10 +1025,39 @@ def sync_to_zapier(visitor_data: dict, agent_data: dict) -> dict:
         # Zapier webhooks typically return 200 with success
         return {"success": True, "zapier_response": response.status_code}
 
-    except requests.exceptions.RequestException as e:
+    except httpx.HTTPError as e:
         return {"success": False, "error": str(e)}
 
-def sync_note_to_zapier(note_data: dict, visitor_data: dict, agent_data: dict) -> dict:
+def mark_visitor_synced(visitor_id: int):
+    """Flag a visitor as synced to CINC"""
+    with get_db() as conn:
+        conn.execute("""
+            UPDATE visitors
+            SET cinc_synced = 1, cinc_sync_at = ?
+            WHERE id = ?
+        """, (_now_iso(), visitor_id))
+    invalidate_dashboard_cache()
+
+async def sync_visitor_and_mark(
+    visitor_id: int,
+    visitor: VisitorCreate,
+    agent_data: dict,
+    buyer_email: str,
+    visit_date: str
+):
+    """
+    Background task: send a new lead to Zapier and flag it as synced.
+    Runs after the response is sent, using its own short write transaction.
+    """
+    zapier_result = await sync_to_zapier(visitor, agent_data, buyer_email, visit_date)
+
+    if not zapier_result["success"]:
+        print(f"⚠ Zapier sync failed for visitor {visitor_id}: {zapier_result.get('error')}")
+        return
+
+    await run_in_threadpool(mark_visitor_synced, visitor_id)
+
+async def sync_note_to_zapier(note_data: dict, visitor_data: dict, agent_data: dict) -> dict:
     """
     Send note/comment to Zapier webhook for syncing to CINC
     """
@@ -700,11 +1065,13 @@ def sync_note_to_zapier(note_data: dict, visitor_data: dict, agent_data: dict) -
         return {"success": False, "error": "Zapier webhook URL not configured"}
 
     try:
+        now_iso = _now_iso()
+
         # Prepare payload for note sync
         payload = {
             "type": "note",  # Distinguish from lead creation
             "note": note_data["note"],
-            "noteTimestamp": note_data.get("created_at", datetime.now(timezone.utc).isoformat()),
+            "noteTimestamp": note_data.get("created_at", now_iso),
 
             # Visitor/Lead Information
             "leadName": visitor_data.get("buyer_name", ""),
@@ -720,21 +1087,20 @@ def sync_note_to_zapier(note_data: dict, visitor_data: dict, agent_data: dict) -
             # Metadata
             "site": visitor_data.get("site", ""),
             "source": "New Homes Lead Tracker - Note",
-            "timestamp": datetime.now(timezone.utc).isoformat()
+            "timestamp": now_iso
         }
 
         # Send to Zapier webhook
-        response = requests.post(
+        response = await app.state.http.post(
             ZAPIER_WEBHOOK_URL,
-            json=payload,
-            headers={"Content-Type": "application/json"},
-            timeout=10
+            content=orjson.dumps(payload),
+            headers={"Content-Type": "application/json"}
         )
 
         response.raise_for_status()
         return {"success": True, "zapier_response": response.status_code}
 
-    except requests.exceptions.RequestException as e:
+    except httpx.HTTPError as e:
         return {"success": False, "error": str(e)}
 
 # API Endpoints
@@ -745,7 +1111,7 @@ def read_root():
 
 # Authentication Endpoints
 @app.post("/login", response_model=Token)
-async def login(form_data: OAuth2PasswordRequestForm = Depends()):
+def login(form_data: OAuth2PasswordRequestForm = Depends()):
     """Login endpoint - returns JWT token"""
     user = authenticate_user(form_data.username, form_data.password)
     if not user:
@@ -774,15 +1140,18 @@ async def read_users_me(current_user: UserInDB = Depends(get_current_user)):
     return current_user
 
 @app.post("/users")
-async def create_user(user: UserCreate, current_user: UserInDB = Depends(get_current_admin_user)):
+def create_user(user: UserCreate, current_user: UserInDB = Depends(get_current_admin_user)):
     """Create new user (admin and super_admin only)"""
     # Only super_admin can create super_admin users
     if user.role == "super_admin" and current_user.role != "super_admin":
         raise HTTPException(status_code=403, detail="Only super admin can create super admin users")
 
-    if user.role not in ["super_admin", "admin", "user"]:
+    if user.role not in VALID_ROLES:
         raise HTTPException(status_code=400, detail="Invalid role")
 
+    # Hash before opening the write transaction
+    password_hash = get_password_hash(user.password)
+
     with get_db() as conn:
         cursor = conn.cursor()
 
@@ -798,7 +1167,6 @@ async def create_user(user: UserCreate, current_user: UserInDB = Depends(get_cur
                 raise HTTPException(status_code=404, detail="Agent not found")
 
         # Create user
-        password_hash = get_password_hash(user.password)
         cursor.execute("""
             INSERT INTO users (username, password_hash, email, role, agent_id)
             VALUES (?, ?, ?, ?, ?)
@@ -807,9 +1175,9 @@ async def create_user(user: UserCreate, current_user: UserInDB = Depends(get_cur
         return {"id": cursor.lastrowid, "username": user.username, "role": user.role}
 
 @app.get("/users")
-async def list_users(current_user: UserInDB = Depends(get_current_admin_user)):
+def list_users(current_user: UserInDB = Depends(get_current_admin_user)):
     """List all users (admin and super_admin only)"""
-    with get_db() as conn:
+    with get_db(readonly=True) as conn:
         cursor = conn.cursor()
         users = cursor.execute("""
             SELECT u.id, u.username, u.email, u.role, u.agent_id, u.active, u.created_at, u.last_login, a.name as agent_name
@@ -818,11 +1186,14 @@ async def list_users(current_user: UserInDB = Depends(get_current_admin_user)):
             ORDER BY u.created_at DESC
         """).fetchall()
 
-        return {"users": [dict(u) for u in users]}
+        return {"users": rows_to_dicts(cursor, users)}
 
 @app.put("/users/{user_id}")
-async def update_user(user_id: int, user_update: UserUpdate, current_user: UserInDB = Depends(get_current_admin_user)):
+def update_user(user_id: int, user_update: UserUpdate, current_user: UserInDB = Depends(get_current_admin_user)):
     """Update user (admin and super_admin only)"""
+    # Hash before opening the write transaction
+    new_password_hash = get_password_hash(user_update.password) if user_update.password is not None else None
+
     with get_db() as conn:
         cursor = conn.cursor()
 
@@ -855,10 +1226,10 @@ async def update_user(user_id: int, user_update: UserUpdate, current_user: UserI
 
         if user_update.password is not None:
             updates.append("password_hash = ?")
-            params.append(get_password_hash(user_update.password))
+            params.append(new_password_hash)
 
         if user_update.role is not None:
-            if user_update.role not in ["super_admin", "admin", "user"]:
+            if user_update.role not in VALID_ROLES:
                 raise HTTPException(status_code=400, detail="Invalid role")
             updates.append("role = ?")
             params.append(user_update.role)
@@ -878,10 +1249,11 @@ async def update_user(user_id: int, user_update: UserUpdate, current_user: UserI
         query = f"UPDATE users SET {', '.join(updates)} WHERE id = ?"
         cursor.execute(query, params)
 
-        return {"message": "User updated successfully"}
+    invalidate_user_caches()
+    return {"message": "User updated successfully"}
 
 @app.delete("/users/{user_id}")
-async def delete_user(user_id: int, current_user: UserInDB = Depends(get_current_admin_user)):
+def delete_user(user_id: int, current_user: UserInDB = Depends(get_current_admin_user)):
     """Delete/deactivate user (admin and super_admin only)"""
     with get_db() as conn:
         cursor = conn.cursor()
@@ -902,12 +1274,13 @@ async def delete_user(user_id: int, current_user: UserInDB = Depends(get_current
         # Deactivate instead of delete to preserve data integrity
         cursor.execute("UPDATE users SET active = 0 WHERE id = ?", (user_id,))
 
-        return {"message": "User deactivated successfully"}
+    invalidate_user_caches()
+    return {"message": "User deactivated successfully"}
 
 @app.get("/users/me")
-async def get_current_user_profile(current_user: UserInDB = Depends(get_current_user)):
+def get_current_user_profile(current_user: UserInDB = Depends(get_current_user)):
     """Get current user's profile information"""
-    with get_db() as conn:
+    with get_db(readonly=True) as conn:
         cursor = conn.cursor()
 
         # Get user with agent info
@@ -924,7 +1297,7 @@ async def get_current_user_profile(current_user: UserInDB = Depends(get_current_
         return dict(user)
 
 @app.patch("/users/me")
-async def update_current_user_profile(
+def update_current_user_profile(
     profile_update: ProfileUpdate,
     current_user: UserInDB = Depends(get_current_user)
 ):
@@ -942,85 +1315,86 @@ async def update_current_user_profile(
         return {"message": "Profile updated successfully"}
 
 @app.patch("/users/me/password")
-async def change_current_user_password(
+def change_current_user_password(
     password_change: PasswordChange,
     current_user: UserInDB = Depends(get_current_user)
 ):
     """Change current user's password"""
-    with get_db() as conn:
-        cursor = conn.cursor()
-
+    with get_db(readonly=True) as conn:
         # Get current password hash
-        user = cursor.execute(
+        user = conn.execute(
             "SELECT password_hash FROM users WHERE id = ?",
             (current_user.id,)
         ).fetchone()
 
-        if not user:
-            raise HTTPException(status_code=404, detail="User not found")
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
 
-        # Verify current password
-        if not verify_password(password_change.current_password, user["password_hash"]):
-            raise HTTPException(status_code=400, detail="Current password is incorrect")
+    # Verify current password
+    if not verify_password(password_change.current_password, user["password_hash"]):
+        raise HTTPException(status_code=400, detail="Current password is incorrect")
 
-        # Hash new password
-        new_password_hash = get_password_hash(password_change.new_password)
+    # Hash new password
+    new_password_hash = get_password_hash(password_change.new_password)
 
+    with get_db() as conn:
         # Update password
-        cursor.execute(
+        conn.execute(
             "UPDATE users SET password_hash = ? WHERE id = ?",
             (new_password_hash, current_user.id)
         )
-        conn.commit()
 
-        return {"message": "Password changed successfully"}
+    return {"message": "Password changed successfully"}
 
 @app.post("/visitors")
-def create_visitor(visitor: VisitorCreate, current_user: UserInDB = Depends(get_current_user)):
+def create_visitor(
+    visitor: VisitorCreate,
+    background_tasks: BackgroundTasks,
+    current_user: UserInDB = Depends(get_current_user)
+):
     """Create new visitor and sync via Zapier webhook"""
-    with get_db() as conn:
-        cursor = conn.cursor()
+    # Determine capturing_agent_id based on user role
+    if visitor.capturing_agent_id:
+        # If capturing_agent_id is provided (admin/super_admin selecting agent)
+        capturing_agent_id = visitor.capturing_agent_id
+    else:
+        # For regular users, use their linked agent_id
+        if not current_user.agent_id:
+            raise HTTPException(
+                status_code=400,
+                detail="Your user account is not linked to an agent. Please contact an administrator."
+            )
+        capturing_agent_id = current_user.agent_id
 
-        # Determine capturing_agent_id based on user role
-        if visitor.capturing_agent_id:
-            # If capturing_agent_id is provided (admin/super_admin selecting agent)
-            capturing_agent_id = visitor.capturing_agent_id
-        else:
-            # For regular users, use their linked agent_id
-            if not current_user.agent_id:
-                raise HTTPException(
-                    status_code=400,
-                    detail="Your user account is not linked to an agent. Please contact an administrator."
-                )
-            capturing_agent_id = current_user.agent_id
+    # Get agent information before taking the write lock
+    with get_db(readonly=True) as conn:
+        agent = get_agent(conn.cursor(), capturing_agent_id)
 
-        # Get agent information
-        agent = cursor.execute(
-            "SELECT id, name, cinc_id, email FROM agents WHERE id = ?",
-            (capturing_agent_id,)
-        ).fetchone()
+    if not agent:
+        raise HTTPException(status_code=404, detail="Agent not found")
 
-        if not agent:
-            raise HTTPException(status_code=404, detail="Agent not found")
+    # Convert lists to comma-separated strings for storage
+    interested_in_str = ",".join(visitor.interested_in) if visitor.interested_in else None
+    builders_requested_str = ",".join(visitor.builders_requested) if visitor.builders_requested else None
 
-        # Convert lists to comma-separated strings for storage
-        interested_in_str = ",".join(visitor.interested_in) if visitor.interested_in else None
-        builders_requested_str = ",".join(visitor.builders_requested) if visitor.builders_requested else None
+    # Convert enum values to strings
+    occupation_str = visitor.occupation.value if visitor.occupation else None
+    timeline_str = visitor.purchase_timeline.value if visitor.purchase_timeline else None
+    discovery_str = visitor.discovery_method.value if visitor.discovery_method else None
+    price_range_str = visitor.price_range.value if visitor.price_range else None
 
-        # Convert enum values to strings
-        occupation_str = visitor.occupation.value if visitor.occupation else None
-        timeline_str = visitor.purchase_timeline.value if visitor.purchase_timeline else None
-        discovery_str = visitor.discovery_method.value if visitor.discovery_method else None
-        price_range_str = visitor.price_range.value if visitor.price_range else None
+    # Generate placeholder email if none provided (needed for CINC lead lookup/updates)
+    buyer_email = visitor.buyer_email
+    if not buyer_email or (isinstance(buyer_email, str) and not buyer_email.strip()):
+        random_string = str(uuid.uuid4())[:8]  # Use first 8 chars of UUID
+        buyer_email = f"{random_string}@noemail.com"
 
-        # Generate placeholder email if none provided (needed for CINC lead lookup/updates)
-        buyer_email = visitor.buyer_email
-        if not buyer_email or (isinstance(buyer_email, str) and not buyer_email.strip()):
-            random_string = str(uuid.uuid4())[:8]  # Use first 8 chars of UUID
-            buyer_email = f"{random_string}@noemail.com"
+    # The write transaction holds only the two INSERTs
+    with get_db() as conn:
+        cursor = conn.cursor()
 
         # Insert visitor with all new fields
-        cursor.execute("""
+        inserted = cursor.execute("""
             INSERT INTO visitors (
                 buyer_name, secondary_visitor, buyer_phone, buyer_email, first_visit,
                 interested_in, purchase_timeline, represented, cobroker_name,
@@ -1030,6 +1404,7 @@ def create_visitor(visitor: VisitorCreate, current_user: UserInDB = Depends(get_
                 location_current, agent_name, capturing_agent_id, created_by_user_id,
                 created_by_username, site
             ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            RETURNING id, created_at
         """, (
             visitor.buyer_name, visitor.secondary_visitor, visitor.buyer_phone, buyer_email,
             visitor.first_visit, interested_in_str, timeline_str,
@@ -1040,9 +1415,9 @@ def create_visitor(visitor: VisitorCreate, current_user: UserInDB = Depends(get_
             visitor.location_looking, visitor.location_current,
             visitor.agent_name, capturing_agent_id, current_user.id,
             current_user.username, visitor.site
-        ))
+        )).fetchone()
 
-        visitor_id = cursor.lastrowid
+        visitor_id = inserted["id"]
 
         # If there's an initial note, add it to visitor_notes table
         if visitor.notes and visitor.notes.strip():
@@ -1051,39 +1426,49 @@ def create_visitor(visitor: VisitorCreate, current_user: UserInDB = Depends(get_
                 VALUES (?, ?, ?)
             """, (visitor_id, capturing_agent_id, visitor.notes.strip()))
 
-        # Sync to Zapier webhook
-        visitor_dict = visitor.dict()
-        visitor_dict["created_at"] = datetime.now(timezone.utc).isoformat()
-        visitor_dict["buyer_email"] = buyer_email  # Use generated placeholder email if applicable
+    invalidate_dashboard_cache()
 
-        agent_dict = {
-            "name": agent["name"],
-            "cinc_id": agent["cinc_id"],
-            "email": agent["email"]
-        }
+    agent_dict = {
+        "name": agent["name"],
+        "cinc_id": agent["cinc_id"],
+        "email": agent["email"]
+    }
 
-        if visitor.represented:
-            return {
-                "id": visitor_id,
-                "synced": False,
-                "sync_error": "Skipped — visitor is represented"
-            }
-
-        zapier_result = sync_to_zapier(visitor_dict, agent_dict)
-
-        if zapier_result["success"]:
-            cursor.execute("""
-                UPDATE visitors
-                SET cinc_synced = 1, cinc_sync_at = ?
-                WHERE id = ?
-            """, (datetime.now(timezone.utc).isoformat(), visitor_id))
+    # Visitor is committed at this point - the webhook runs after the response
+    # is sent so the write connection is never held across the HTTP call
+    if visitor.represented:
+        return {
+            "id": visitor_id,
+            "synced": False,
+            "sync_error": "Skipped — visitor is represented"
+        }
 
+    if not ZAPIER_WEBHOOK_URL:
         return {
             "id": visitor_id,
-            "synced": zapier_result["success"],
-            "sync_error": zapier_result.get("error")
+            "synced": False,
+            "sync_error": "Zapier webhook URL not configured"
         }
 
+    # buyer_email may be the generated placeholder, so pass it alongside the
+    # model; the visit date is the stored created_at (UTC), not a second clock read
+    visit_date = datetime.fromisoformat(inserted["created_at"]).replace(tzinfo=timezone.utc).isoformat()
+    background_tasks.add_task(
+        sync_visitor_and_mark,
+        visitor_id,
+        visitor,
+        agent_dict,
+        buyer_email,
+        visit_date
+    )
+
+    return {
+        "id": visitor_id,
+        "synced": False,
+        "sync_queued": True,
+        "sync_error": None
+    }
+
 @app.get("/visitors")
 def list_visitors(
     page: int = 1,
@@ -1097,6 +1482,7 @@ def list_visitors(
     purchase_timeline: Optional[PurchaseTimeline] = None,
     price_range: Optional[PriceRange] = None,
     cinc_synced: Optional[bool] = None,
+    page_cursor: Optional[str] = Query(None, alias="cursor"),
     current_user: UserInDB = Depends(get_current_user)
 ):
     """
@@ -1115,6 +1501,7 @@ def list_visitors(
     - purchase_timeline: Filter by purchase timeline
     - price_range: Filter by price range
     - cinc_synced: Filter by CINC sync status (true/false)
+    - cursor: next_cursor from the previous page; seeks past it instead of using page
     """
     # Validate pagination
     if page < 1:
@@ -1124,7 +1511,7 @@ def list_visitors(
 
     offset = (page - 1) * page_size
 
-    with get_db() as conn:
+    with get_db(readonly=True) as conn:
         cursor = conn.cursor()
 
         # Build WHERE clause
@@ -1148,17 +1535,22 @@ def list_visitors(
             params.append(site)
 
         # Search filter (name, phone, email)
-        if search:
+        if search and len(search) >= 3:
+            # Trigram index lookup; quoted so the term is matched literally
+            where_conditions.append("id IN (SELECT rowid FROM visitors_fts WHERE visitors_fts MATCH ?)")
+            params.append('"' + search.replace('"', '""') + '"')
+        elif search:
+            # Too short for trigrams - fall back to a scan
             search_term = f"%{search}%"
             where_conditions.append("(buyer_name LIKE ? OR buyer_phone LIKE ? OR buyer_email LIKE ?)")
             params.extend([search_term, search_term, search_term])
 
-        # Date range filter
+        # Date range filter - compare the raw column so the created_at index applies
         if date_from:
-            where_conditions.append("DATE(created_at) >= DATE(?)")
+            where_conditions.append("created_at >= DATE(?)")
             params.append(date_from)
         if date_to:
-            where_conditions.append("DATE(created_at) <= DATE(?)")
+            where_conditions.append("created_at < DATE(?, '+1 day')")
             params.append(date_to)
 
         # Purchase timeline filter
@@ -1179,38 +1571,80 @@ def list_visitors(
         # Construct WHERE clause
         where_clause = " AND ".join(where_conditions) if where_conditions else "1=1"
 
-        # Get total count
-        count_query = f"SELECT COUNT(*) as total FROM visitor_details WHERE {where_clause}"
-        total = cursor.execute(count_query, params).fetchone()["total"]
-
-        # Get paginated results with sorting
         sort_column = sort_by.value
         sort_direction = sort_order.value.upper()
+        count_key = (where_clause, tuple(params))
+        count_query = f"SELECT COUNT(*) as total FROM visitors WHERE {where_clause}"
+
+        if page_cursor:
+            # Keyset page: seek straight past the previous page's last row
+            cursor_value, cursor_id = decode_page_cursor(page_cursor, sort_column)
+            visitors = []
+            for seek_condition, seek_params in page_seek_segments(sort_column, sort_direction, cursor_value, cursor_id):
+                query = f"""
+                    SELECT {VISITOR_LIST_COLUMNS}
+                    FROM visitor_details
+                    WHERE {where_clause} AND {seek_condition}
+                    ORDER BY {sort_column} {sort_direction}, id {sort_direction}
+                    LIMIT ?
+                """
+                visitors += cursor.execute(query, params + seek_params + [page_size - len(visitors)]).fetchall()
+                if len(visitors) == page_size:
+                    break
+            columns = [desc[0] for desc in cursor.description]
+
+            with _visitor_count_cache_lock:
+                total = _visitor_count_cache.get(count_key)
+            if total is None:
+                total = cursor.execute(count_query, params).fetchone()["total"]
+                with _visitor_count_cache_lock:
+                    _visitor_count_cache[count_key] = total
+        else:
+            # Offset page; the window count gives the filtered total from the
+            # same scan, so no separate COUNT query
+            query = f"""
+                SELECT {VISITOR_LIST_COLUMNS}, COUNT(*) OVER() as total_count
+                FROM visitor_details
+                WHERE {where_clause}
+                ORDER BY {sort_column} {sort_direction}, id {sort_direction}
+                LIMIT ? OFFSET ?
+            """
+            visitors = cursor.execute(query, params + [page_size, offset]).fetchall()
+            columns = [desc[0] for desc in cursor.description][:-1]
+
+            if visitors:
+                total = visitors[0]["total_count"]
+            elif offset:
+                # Page past the end returns no rows to carry the total
+                total = cursor.execute(count_query, params).fetchone()["total"]
+            else:
+                total = 0
 
-        query = f"""
-            SELECT * FROM visitor_details
-            WHERE {where_clause}
-            ORDER BY {sort_column} {sort_direction}
-            LIMIT ? OFFSET ?
-        """
-        params.extend([page_size, offset])
-
-        visitors = cursor.execute(query, params).fetchall()
+            with _visitor_count_cache_lock:
+                _visitor_count_cache[count_key] = total
 
         total_pages = (total + page_size - 1) // page_size
 
-        return {
-            "visitors": [dict(v) for v in visitors],
+        next_cursor = None
+        if len(visitors) == page_size:
+            last = visitors[-1]
+            next_cursor = encode_page_cursor(sort_column, last[sort_column], last["id"])
+
+        # Rows hold only SQLite scalars, so hand them straight to orjson
+        # rather than walking every value through jsonable_encoder
+        return ORJSONResponse({
+            "visitors": [dict(zip(columns, row)) for row in visitors],
             "total": total,
             "page": page,
             "page_size": page_size,
-            "total_pages": total_pages
-        }
+            "total_pages": total_pages,
+            "next_cursor": next_cursor
+        })
 
 @app.get("/visitors/{visitor_id}")
 def get_visitor(visitor_id: int, current_user: UserInDB = Depends(get_current_user)):
     """Get single visitor with all notes. Users can only see leads from their assigned sites."""
-    with get_db() as conn:
+    with get_db(readonly=True) as conn:
         cursor = conn.cursor()
 
         visitor = cursor.execute(
@@ -1239,11 +1673,16 @@ def get_visitor(visitor_id: int, current_user: UserInDB = Depends(get_current_us
 
         return {
             "visitor": dict(visitor),
-            "notes": [dict(n) for n in notes]
+            "notes": rows_to_dicts(cursor, notes)
         }
 
 @app.put("/visitors/{visitor_id}")
-def update_visitor(visitor_id: int, update: VisitorUpdate, current_user: UserInDB = Depends(get_current_user)):
+def update_visitor(
+    visitor_id: int,
+    update: VisitorUpdate,
+    background_tasks: BackgroundTasks,
+    current_user: UserInDB = Depends(get_current_user)
+):
     """Update visitor. Users can only edit visitors they created; admins can edit any."""
     with get_db() as conn:
         cursor = conn.cursor()
@@ -1256,7 +1695,7 @@ def update_visitor(visitor_id: int, update: VisitorUpdate, current_user: UserInD
         if not visitor:
             raise HTTPException(status_code=404, detail="Visitor not found")
 
-        is_admin = current_user.role in ("admin", "super_admin")
+        is_admin = current_user.role in ADMIN_ROLES
         is_creator = visitor["created_by_user_id"] == current_user.id
 
         if not is_admin and not is_creator:
@@ -1310,7 +1749,9 @@ def update_visitor(visitor_id: int, update: VisitorUpdate, current_user: UserInD
             if old_str != new_str:
                 changes.append(f"{label}: {old_str} → {new_str}")
 
-        data["updated_at"] = datetime.now(timezone.utc).isoformat()
+        # One timestamp for the edit and its audit note
+        now_iso = _now_iso()
+        data["updated_at"] = now_iso
 
         set_clause = ", ".join(f"{k} = ?" for k in data.keys())
         values = list(data.values()) + [visitor_id]
@@ -1321,29 +1762,27 @@ def update_visitor(visitor_id: int, update: VisitorUpdate, current_user: UserInD
         if changes:
             agent_id = current_user.agent_id or visitor["capturing_agent_id"]
             note_text = f"[Edited by {current_user.username}] " + "; ".join(changes)
-            created_at = datetime.now(timezone.utc).isoformat()
 
             cursor.execute(
-                "INSERT INTO visitor_notes (visitor_id, agent_id, note) VALUES (?, ?, ?)",
-                (visitor_id, agent_id, note_text)
+                "INSERT INTO visitor_notes (visitor_id, agent_id, note, created_at) VALUES (?, ?, ?, ?)",
+                (visitor_id, agent_id, note_text, now_iso)
             )
 
-            agent = cursor.execute(
-                "SELECT id, name, cinc_id, email FROM agents WHERE id = ?",
-                (agent_id,)
-            ).fetchone()
+            agent = get_agent(cursor, agent_id)
 
             conn.commit()
 
             if not visitor["represented"]:
-                sync_note_to_zapier(
-                    {"note": note_text, "created_at": created_at},
+                background_tasks.add_task(
+                    sync_note_to_zapier,
+                    {"note": note_text, "created_at": now_iso},
                     dict(visitor),
                     dict(agent) if agent else {}
                 )
         else:
             conn.commit()
 
+        invalidate_dashboard_cache()
         return {"message": "Visitor updated successfully"}
 
 @app.get("/visitors/check/name")
@@ -1355,7 +1794,7 @@ def check_visitor_name(name: str, current_user: UserInDB = Depends(get_current_u
     if not name or len(name.strip()) < 2:
         raise HTTPException(status_code=400, detail="Name must be at least 2 characters")
 
-    with get_db() as conn:
+    with get_db(readonly=True) as conn:
         cursor = conn.cursor()
 
         # Search for visitors with similar names (case-insensitive)
@@ -1373,11 +1812,16 @@ def check_visitor_name(name: str, current_user: UserInDB = Depends(get_current_u
         return {
             "exists": len(visitors) > 0,
             "count": len(visitors),
-            "matches": [dict(v) for v in visitors]
+            "matches": rows_to_dicts(cursor, visitors)
         }
 
 @app.post("/visitors/{visitor_id}/notes")
-def add_note(visitor_id: int, note: NoteCreate, current_user: UserInDB = Depends(get_current_user)):
+def add_note(
+    visitor_id: int,
+    note: NoteCreate,
+    background_tasks: BackgroundTasks,
+    current_user: UserInDB = Depends(get_current_user)
+):
     """Add timestamped note to visitor and sync to CINC"""
     with get_db() as conn:
         cursor = conn.cursor()
@@ -1391,19 +1835,16 @@ def add_note(visitor_id: int, note: NoteCreate, current_user: UserInDB = Depends
             raise HTTPException(status_code=404, detail="Visitor not found")
 
         # Get agent data for sync
-        agent = cursor.execute(
-            "SELECT id, name, cinc_id, email FROM agents WHERE id = ?",
-            (note.agent_id,)
-        ).fetchone()
+        agent = get_agent(cursor, note.agent_id)
 
-        # Insert note
+        # Insert note; the stored, returned and synced timestamps are the same value
+        created_at = _now_iso()
         cursor.execute("""
-            INSERT INTO visitor_notes (visitor_id, agent_id, note)
-            VALUES (?, ?, ?)
-        """, (visitor_id, note.agent_id, note.note))
+            INSERT INTO visitor_notes (visitor_id, agent_id, note, created_at)
+            VALUES (?, ?, ?, ?)
+        """, (visitor_id, note.agent_id, note.note, created_at))
 
         note_id = cursor.lastrowid
-        created_at = datetime.now(timezone.utc).isoformat()
 
         cursor.execute("UPDATE visitors SET updated_at = ? WHERE id = ?",
                       (created_at, visitor_id))
@@ -1418,15 +1859,22 @@ def add_note(visitor_id: int, note: NoteCreate, current_user: UserInDB = Depends
         agent_dict = dict(agent) if agent else {}
 
         if visitor["represented"]:
-            sync_result = {"success": False, "error": "Skipped — visitor is represented"}
-        else:
-            sync_result = sync_note_to_zapier(note_data, visitor_dict, agent_dict)
+            return {
+                "id": note_id,
+                "created_at": created_at,
+                "synced": False,
+                "sync_error": "Skipped — visitor is represented"
+            }
+
+        # Note sync runs after the response is sent
+        background_tasks.add_task(sync_note_to_zapier, note_data, visitor_dict, agent_dict)
 
         return {
             "id": note_id,
             "created_at": created_at,
-            "synced": sync_result["success"],
-            "sync_error": sync_result.get("error")
+            "synced": False,
+            "sync_queued": True,
+            "sync_error": None
         }
 
 @app.delete("/visitors/{visitor_id}")
@@ -1436,7 +1884,7 @@ def delete_visitor(visitor_id: int, current_user: UserInDB = Depends(get_current
     Users cannot delete visitors - only admins can perform this action
     """
     # Only admins and super_admins can delete visitors
-    if current_user.role not in ["admin", "super_admin"]:
+    if current_user.role not in ADMIN_ROLES:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Only administrators can delete visitors"
@@ -1459,6 +1907,8 @@ def delete_visitor(visitor_id: int, current_user: UserInDB = Depends(get_current
 
         # Delete visitor
         cursor.execute("DELETE FROM visitors WHERE id = ?", (visitor_id,))
+        conn.commit()
+        invalidate_dashboard_cache()
 
         return {
             "message": "Visitor deleted successfully",
@@ -1469,109 +1919,97 @@ def delete_visitor(visitor_id: int, current_user: UserInDB = Depends(get_current
 @app.get("/visitors/export/csv")
 def export_visitors_csv(site: Optional[str] = None, current_user: UserInDB = Depends(get_current_user)):
     """Export visitors to CSV with all notes. Users only export their own leads."""
-    with get_db() as conn:
-        cursor = conn.cursor()
-
-        # Users can only export their own visitors
-        if current_user.role == "user":
-            if site:
-                visitors = cursor.execute(
-                    "SELECT * FROM visitor_details WHERE site = ? AND capturing_agent_id = ? ORDER BY created_at DESC",
-                    (site, current_user.agent_id)
-                ).fetchall()
-            else:
-                visitors = cursor.execute(
-                    "SELECT * FROM visitor_details WHERE capturing_agent_id = ? ORDER BY created_at DESC",
-                    (current_user.agent_id,)
-                ).fetchall()
-        else:  # admin
-            if site:
-                visitors = cursor.execute(
-                    "SELECT * FROM visitor_details WHERE site = ? ORDER BY created_at DESC",
-                    (site,)
-                ).fetchall()
-            else:
-                visitors = cursor.execute(
-                    "SELECT * FROM visitor_details ORDER BY created_at DESC"
-                ).fetchall()
-
-        # Create CSV in memory with notes
-        output = io.StringIO()
-
-        # Define custom fieldnames including notes column
-        base_fieldnames = [desc[0] for desc in cursor.description]
-        fieldnames = base_fieldnames + ['all_notes']
-
-        writer = csv.DictWriter(output, fieldnames=fieldnames)
-        writer.writeheader()
-
-        for visitor in visitors:
-            visitor_dict = dict(visitor)
-
-            # Get all notes for this visitor
-            notes = cursor.execute("""
-                SELECT n.note, n.created_at, a.name as agent_name
-                FROM visitor_notes n
-                JOIN agents a ON n.agent_id = a.id
-                WHERE n.visitor_id = ?
-                ORDER BY n.created_at DESC
-            """, (visitor['id'],)).fetchall()
-
-            # Format notes as a single field with line breaks
-            if notes:
-                notes_text = " | ".join([
-                    f"[{note['created_at']} - {note['agent_name']}] {note['note']}"
-                    for note in notes
-                ])
-                visitor_dict['all_notes'] = notes_text
-            else:
-                visitor_dict['all_notes'] = ''
-
-            writer.writerow(visitor_dict)
-
-        output.seek(0)
+    # Only needed here - imported lazily to keep them off the startup path
+    import csv
+    import io
+
+    where_conditions = []
+    params = []
+
+    # Users can only export their own visitors
+    if current_user.role == "user":
+        where_conditions.append("capturing_agent_id = ?")
+        params.append(current_user.agent_id)
+
+    if site:
+        where_conditions.append("site = ?")
+        params.append(site)
+
+    where_clause = f"WHERE {' AND '.join(where_conditions)}" if where_conditions else ""
+    # Notes are folded into one newest-first column inside SQLite rather than
+    # queried per visitor
+    query = f"""
+        SELECT vd.*,
+            IFNULL((
+                SELECT GROUP_CONCAT('[' || IFNULL(created_at, '') || ' - ' || agent_name || '] ' || note, ' | ')
+                FROM (
+                    SELECT n.created_at, a.name as agent_name, n.note
+                    FROM visitor_notes n
+                    JOIN agents a ON n.agent_id = a.id
+                    WHERE n.visitor_id = vd.id
+                    ORDER BY n.created_at DESC
+                )
+            ), '') as all_notes
+        FROM visitor_details vd
+        {where_clause}
+        ORDER BY vd.created_at DESC
+    """
 
-        return StreamingResponse(
-            iter([output.getvalue()]),
-            media_type="text/csv",
-            headers={"Content-Disposition": "attachment; filename=leads_export.csv"}
-        )
+    def generate_csv():
+        """Yield the CSV in fetchmany-sized chunks while iterating the cursor"""
+        # The connection stays open until the client has downloaded the whole
+        # file, so use a dedicated one - a few slow downloads holding
+        # READ_POOL connections would stall every other read endpoint
+        conn = connect_db(readonly=True)
+        try:
+            cursor = conn.execute(query, params)
+
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            writer.writerow([desc[0] for desc in cursor.description])
+            yield buffer.getvalue()
+
+            while True:
+                rows = cursor.fetchmany(500)
+                if not rows:
+                    break
+                buffer.seek(0)
+                buffer.truncate()
+                writer.writerows(rows)
+                yield buffer.getvalue()
+        finally:
+            conn.close()
+
+    return StreamingResponse(
+        generate_csv(),
+        media_type="text/csv",
+        headers={"Content-Disposition": "attachment; filename=leads_export.csv"}
+    )
 
 # Agent Management
 @app.get("/agents")
 def list_agents(site: Optional[str] = None, current_user: UserInDB = Depends(get_current_user)):
     """List all agents with their site assignments"""
-    with get_db() as conn:
-        cursor = conn.cursor()
-
-        # Get agents with site counts
-        if site:
-            # Get agents assigned to specific site
-            agents = cursor.execute("""
-                SELECT DISTINCT a.*
-                FROM agents a
-                JOIN agent_sites ags ON a.id = ags.agent_id
-                WHERE ags.site = ? AND a.active = 1
-                ORDER BY a.name
-            """, (site,)).fetchall()
-        else:
-            agents = cursor.execute(
-                "SELECT * FROM agents WHERE active = 1 ORDER BY name"
-            ).fetchall()
-
-        # Get sites for each agent
-        agents_with_sites = []
-        for agent in agents:
-            sites = cursor.execute(
-                "SELECT site FROM agent_sites WHERE agent_id = ? ORDER BY site",
-                (agent["id"],)
-            ).fetchall()
-
-            agent_dict = dict(agent)
-            agent_dict["sites"] = [s["site"] for s in sites]
-            agents_with_sites.append(agent_dict)
-
-        return {"agents": agents_with_sites}
+    site_filter = "AND id IN (SELECT agent_id FROM agent_sites WHERE site = ?)" if site else ""
+    params = (site,) if site else ()
+
+    with get_db(readonly=True) as conn:
+        # SQLite builds the whole array, sites included, in one statement;
+        # the JSON text is returned as-is with no per-row Python objects
+        agents_json = conn.execute(f"""
+            SELECT json_group_array(json_object(
+                'id', a.id, 'name', a.name, 'cinc_id', a.cinc_id,
+                'email', a.email, 'phone', a.phone, 'active', a.active,
+                'created_at', a.created_at,
+                'sites', json((
+                    SELECT json_group_array(site)
+                    FROM (SELECT site FROM agent_sites WHERE agent_id = a.id ORDER BY site)
+                ))
+            ))
+            FROM (SELECT * FROM agents WHERE active = 1 {site_filter} ORDER BY name) a
+        """, params).fetchone()[0]
+
+    return Response(content='{"agents":' + agents_json + '}', media_type="application/json")
 
 @app.put("/agents/{agent_id}")
 def update_agent(
@@ -1629,16 +2067,13 @@ def update_agent(
                 )
 
         conn.commit()
+        invalidate_agent_cache(agent_id)
+        invalidate_dashboard_cache()
 
         # Return updated agent with sites
         updated_agent = cursor.execute("SELECT * FROM agents WHERE id = ?", (agent_id,)).fetchone()
-        agent_sites = cursor.execute(
-            "SELECT site FROM agent_sites WHERE agent_id = ? ORDER BY site",
-            (agent_id,)
-        ).fetchall()
-
         result = dict(updated_agent)
-        result["sites"] = [s["site"] for s in agent_sites]
+        result["sites"] = get_agent_site_names(conn, agent_id)
 
         return result
 
@@ -1668,16 +2103,13 @@ def create_agent(
                     )
 
             conn.commit()
+            invalidate_agent_cache(agent_id)
+            invalidate_dashboard_cache()
 
             # Return created agent with sites
             agent = cursor.execute("SELECT * FROM agents WHERE id = ?", (agent_id,)).fetchone()
-            agent_sites = cursor.execute(
-                "SELECT site FROM agent_sites WHERE agent_id = ? ORDER BY site",
-                (agent_id,)
-            ).fetchall()
-
             result = dict(agent)
-            result["sites"] = [s["site"] for s in agent_sites]
+            result["sites"] = get_agent_site_names(conn, agent_id)
 
             return result
 
@@ -1701,207 +2133,229 @@ def deactivate_agent(
         # Soft delete by setting active = 0
         cursor.execute("UPDATE agents SET active = 0 WHERE id = ?", (agent_id,))
         conn.commit()
+        invalidate_agent_cache(agent_id)
+        invalidate_dashboard_cache()
 
         return {"message": "Agent deactivated successfully"}
 
 @app.get("/sites")
 def list_sites():
     """Get unique list of all sites/communities from agent_sites table"""
-    with get_db() as conn:
-        cursor = conn.cursor()
+    with get_db(readonly=True) as conn:
         # Get all unique sites from agent_sites table (includes all configured sites)
-        sites = cursor.execute("SELECT DISTINCT site FROM agent_sites WHERE site IS NOT NULL ORDER BY site").fetchall()
-        return {"sites": [s["site"] for s in sites]}
+        sites_json = conn.execute("""
+            SELECT json_group_array(site)
+            FROM (SELECT DISTINCT site FROM agent_sites WHERE site IS NOT NULL ORDER BY site)
+        """).fetchone()[0]
+
+    return Response(content='{"sites":' + sites_json + '}', media_type="application/json")
 
 @app.get("/stats")
 def get_stats(site: Optional[str] = None, current_user: UserInDB = Depends(get_current_user)):
     """Get dashboard statistics. Users see stats from their assigned sites, admins and super_admins see all."""
-    with get_db() as conn:
+    return cached_dashboard("stats", current_user, site, lambda: _compute_stats(site, current_user))
+
+def _compute_stats(site: Optional[str], current_user: UserInDB) -> dict:
+    with get_db(readonly=True) as conn:
         cursor = conn.cursor()
 
+        where_conditions = []
+        params = []
+
         # Users only see stats from their assigned sites
         if current_user.role == "user":
-            # Get sites assigned to this user's agent
-            agent_sites = cursor.execute(
-                "SELECT site FROM agent_sites WHERE agent_id = ?",
-                (current_user.agent_id,)
-            ).fetchall()
-            site_list = [s["site"] for s in agent_sites]
-
-            if not site_list:
-                # No assigned sites, return zeros
-                total_visitors = 0
-                today_visitors = 0
-                cinc_synced = 0
-            elif site:
-                # Filter by specific site (if it's in their assigned sites)
-                if site in site_list:
-                    total_visitors = cursor.execute(
-                        "SELECT COUNT(*) as count FROM visitors WHERE site = ?",
-                        (site,)
-                    ).fetchone()["count"]
-
-                    today_visitors = cursor.execute("""
-                        SELECT COUNT(*) as count FROM visitors
-                        WHERE site = ? AND DATE(created_at) = DATE('now')
-                    """, (site,)).fetchone()["count"]
-
-                    cinc_synced = cursor.execute(
-                        "SELECT COUNT(*) as count FROM visitors WHERE cinc_synced = 1 AND site = ?",
-                        (site,)
-                    ).fetchone()["count"]
-                else:
-                    # Requested site not in their assigned sites
-                    total_visitors = 0
-                    today_visitors = 0
-                    cinc_synced = 0
-            else:
-                # All their assigned sites
+            site_list = get_user_accessible_sites(cursor, current_user)
+
+            # No assigned sites, or requested site not in their assigned sites
+            if not site_list or (site and site not in site_list):
+                return {"total_visitors": 0, "today_visitors": 0, "cinc_synced": 0}
+
+            if not site:
                 placeholders = ",".join(["?" for _ in site_list])
-                total_visitors = cursor.execute(
-                    f"SELECT COUNT(*) as count FROM visitors WHERE site IN ({placeholders})",
-                    site_list
-                ).fetchone()["count"]
-
-                today_visitors = cursor.execute(
-                    f"""SELECT COUNT(*) as count FROM visitors
-                    WHERE site IN ({placeholders}) AND DATE(created_at) = DATE('now')""",
-                    site_list
-                ).fetchone()["count"]
-
-                cinc_synced = cursor.execute(
-                    f"SELECT COUNT(*) as count FROM visitors WHERE cinc_synced = 1 AND site IN ({placeholders})",
-                    site_list
-                ).fetchone()["count"]
-        else:  # admin sees all
-            if site:
-                total_visitors = cursor.execute(
-                    "SELECT COUNT(*) as count FROM visitors WHERE site = ?", (site,)
-                ).fetchone()["count"]
-
-                today_visitors = cursor.execute("""
-                    SELECT COUNT(*) as count FROM visitors
-                    WHERE site = ? AND DATE(created_at) = DATE('now')
-                """, (site,)).fetchone()["count"]
-            else:
-                total_visitors = cursor.execute(
-                    "SELECT COUNT(*) as count FROM visitors"
-                ).fetchone()["count"]
+                where_conditions.append(f"site IN ({placeholders})")
+                params.extend(site_list)
 
-                today_visitors = cursor.execute("""
-                    SELECT COUNT(*) as count FROM visitors
-                    WHERE DATE(created_at) = DATE('now')
-                """).fetchone()["count"]
+        if site:
+            where_conditions.append("site = ?")
+            params.append(site)
+
+        where_clause = f"WHERE {' AND '.join(where_conditions)}" if where_conditions else ""
+
+        # Today as a half-open UTC range on the raw column, so no DATE() call per row
+        today = datetime.now(timezone.utc).date()
+        tomorrow = today + timedelta(days=1)
+
+        if not where_clause:
+            # Unfiltered: total comes from the trigger-maintained counter and
+            # the other two are index range counts, so nothing scans visitors
+            stats = cursor.execute("""
+                SELECT
+                    COALESCE(
+                        (SELECT value FROM counters WHERE name = 'visitors'),
+                        (SELECT COUNT(*) FROM visitors)
+                    ) as total,
+                    (SELECT COUNT(*) FROM visitors WHERE created_at >= ? AND created_at < ?) as today,
+                    (SELECT COUNT(*) FROM visitors WHERE cinc_synced = 1) as synced
+            """, (today.isoformat(), tomorrow.isoformat())).fetchone()
+
+            return {
+                "total_visitors": stats["total"],
+                "today_visitors": stats["today"],
+                "cinc_synced": stats["synced"]
+            }
 
-            cinc_synced = cursor.execute(
-                "SELECT COUNT(*) as count FROM visitors WHERE cinc_synced = 1"
-            ).fetchone()["count"]
+        # All three counters in a single pass over visitors
+        stats = cursor.execute(f"""
+            SELECT
+                COUNT(*) as total,
+                COUNT(*) FILTER (WHERE created_at >= ? AND created_at < ?) as today,
+                COUNT(*) FILTER (WHERE cinc_synced = 1) as synced
+            FROM visitors
+            {where_clause}
+        """, [today.isoformat(), tomorrow.isoformat()] + params).fetchone()
 
         return {
-            "total_visitors": total_visitors,
-            "today_visitors": today_visitors,
-            "cinc_synced": cinc_synced
+            "total_visitors": stats["total"],
+            "today_visitors": stats["today"],
+            "cinc_synced": stats["synced"]
         }
 
 @app.get("/analytics")
 def get_analytics(site: Optional[str] = None, current_user: UserInDB = Depends(get_current_user)):
     """Get analytics data for charts and graphs"""
-    with get_db() as conn:
-        cursor = conn.cursor()
+    content = cached_dashboard("analytics", current_user, site, lambda: _compute_analytics(site, current_user))
+    return Response(content=content, media_type="application/json")
 
-        # Base WHERE clause for role-based filtering
-        where_clause = ""
-        params = []
+def analytics_where(current_user: UserInDB, site: Optional[str]) -> tuple[str, list]:
+    """
+    Role-based WHERE clause and params for the analytics aggregates.
+    Values are always bound, so each query has one SQL text per filter shape
+    and stays in the connection's statement cache.
+    """
+    conditions = []
+    params = []
 
-        if current_user.role == "user":
-            where_clause = "WHERE capturing_agent_id = ?"
-            params.append(current_user.agent_id)
-            if site:
-                where_clause += " AND site = ?"
-                params.append(site)
-        else:  # admin
-            if site:
-                where_clause = "WHERE site = ?"
-                params.append(site)
+    if current_user.role == "user":
+        conditions.append("capturing_agent_id = ?")
+        params.append(current_user.agent_id)
+    if site:
+        conditions.append("site = ?")
+        params.append(site)
+
+    where_clause = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    return where_clause, params
+
+# Runs independent read queries side by side, each on its own pooled read
+# connection; WAL lets them scan concurrently.
+READ_EXECUTOR = ThreadPoolExecutor(max_workers=READ_POOL.size, thread_name_prefix="sqlite-read")
+
+def fetch_value_readonly(sql: str, params=()):
+    """Run one read query on a pooled connection and return its single value"""
+    with get_db(readonly=True) as conn:
+        return conn.execute(sql, params).fetchone()[0]
 
+def _compute_analytics(site: Optional[str], current_user: UserInDB) -> str:
+    """Build the analytics response body; every section is JSON built by SQLite"""
+    where_clause, params = analytics_where(current_user, site)
+
+    queries = {
         # Leads by day (last 30 days)
-        leads_by_day = cursor.execute(f"""
-            SELECT DATE(created_at) as date, COUNT(*) as count
-            FROM visitors
-            {where_clause}
-            GROUP BY DATE(created_at)
-            ORDER BY date DESC
-            LIMIT 30
-        """, params).fetchall()
+        "leads_by_day": (f"""
+            SELECT json_group_array(json_object('date', date, 'count', count))
+            FROM (
+                SELECT DATE(created_at) as date, COUNT(*) as count
+                FROM visitors
+                {where_clause}
+                GROUP BY DATE(created_at)
+                ORDER BY date DESC
+                LIMIT 30
+            )
+        """, params),
 
         # Leads by timeline
-        leads_by_timeline = cursor.execute(f"""
-            SELECT purchase_timeline, COUNT(*) as count
-            FROM visitors
-            {where_clause}
-            GROUP BY purchase_timeline
-        """, params).fetchall()
+        "leads_by_timeline": (f"""
+            SELECT json_group_array(json_object('timeline', COALESCE(purchase_timeline, 'Unknown'), 'count', count))
+            FROM (
+                SELECT purchase_timeline, COUNT(*) as count
+                FROM visitors
+                {where_clause}
+                GROUP BY purchase_timeline
+            )
+        """, params),
 
         # Leads by price range
-        leads_by_price = cursor.execute(f"""
-            SELECT price_range, COUNT(*) as count
-            FROM visitors
-            {where_clause}
-            GROUP BY price_range
-        """, params).fetchall()
+        "leads_by_price": (f"""
+            SELECT json_group_array(json_object('price_range', COALESCE(price_range, 'Unknown'), 'count', count))
+            FROM (
+                SELECT price_range, COUNT(*) as count
+                FROM visitors
+                {where_clause}
+                GROUP BY price_range
+            )
+        """, params),
 
         # Leads by site/community
-        leads_by_site = cursor.execute(f"""
-            SELECT site, COUNT(*) as count
-            FROM visitors
-            {where_clause}
-            GROUP BY site
-            ORDER BY count DESC
-        """, params).fetchall()
-
-        # Leads by agent (admins only)
-        leads_by_agent = []
-        if current_user.role in ["admin", "super_admin"]:
-            if site:
-                # Filter agents by site and count their visitors
-                leads_by_agent = cursor.execute("""
+        "leads_by_site": (f"""
+            SELECT json_group_array(json_object('site', site, 'count', count))
+            FROM (
+                SELECT site, COUNT(*) as count
+                FROM visitors
+                {where_clause}
+                GROUP BY site
+                ORDER BY count DESC
+            )
+        """, params),
+    }
+
+    # Leads by agent (admins only)
+    if current_user.role in ADMIN_ROLES:
+        if site:
+            # Filter agents by site and count their visitors
+            queries["leads_by_agent"] = ("""
+                SELECT json_group_array(json_object('agent_name', agent_name, 'count', count))
+                FROM (
                     SELECT a.name as agent_name, COUNT(v.id) as count
                     FROM agents a
                     INNER JOIN agent_sites ags ON ags.agent_id = a.id AND ags.site = ?
                     LEFT JOIN visitors v ON a.id = v.capturing_agent_id AND v.site = ?
                     GROUP BY a.id, a.name
                     ORDER BY count DESC
-                """, (site, site)).fetchall()
-            else:
-                # All agents and their visitor counts
-                leads_by_agent = cursor.execute("""
+                )
+            """, (site, site))
+        else:
+            # All agents and their visitor counts
+            queries["leads_by_agent"] = ("""
+                SELECT json_group_array(json_object('agent_name', agent_name, 'count', count))
+                FROM (
                     SELECT a.name as agent_name, COUNT(v.id) as count
                     FROM agents a
                     LEFT JOIN visitors v ON a.id = v.capturing_agent_id
                     GROUP BY a.id, a.name
                     ORDER BY count DESC
-                """).fetchall()
-
-        # CINC sync rate
-        sync_stats = cursor.execute(f"""
-            SELECT
-                SUM(CASE WHEN cinc_synced = 1 THEN 1 ELSE 0 END) as synced,
-                SUM(CASE WHEN cinc_synced = 0 THEN 1 ELSE 0 END) as not_synced
-            FROM visitors
-            {where_clause}
-        """, params).fetchone()
+                )
+            """, ())
 
-        return {
-            "leads_by_day": [{"date": row["date"], "count": row["count"]} for row in leads_by_day],
-            "leads_by_timeline": [{"timeline": row["purchase_timeline"] or "Unknown", "count": row["count"]} for row in leads_by_timeline],
-            "leads_by_price": [{"price_range": row["price_range"] or "Unknown", "count": row["count"]} for row in leads_by_price],
-            "leads_by_site": [{"site": row["site"], "count": row["count"]} for row in leads_by_site],
-            "leads_by_agent": [{"agent_name": row["agent_name"], "count": row["count"]} for row in leads_by_agent],
-            "sync_stats": {
-                "synced": sync_stats["synced"] or 0,
-                "not_synced": sync_stats["not_synced"] or 0
-            }
-        }
+    # CINC sync rate
+    queries["sync_stats"] = (f"""
+        SELECT json_object(
+            'synced', COUNT(*) FILTER (WHERE cinc_synced = 1),
+            'not_synced', COUNT(*) FILTER (WHERE cinc_synced = 0)
+        )
+        FROM visitors
+        {where_clause}
+    """, params)
+
+    futures = {
+        name: READ_EXECUTOR.submit(fetch_value_readonly, sql, query_params)
+        for name, (sql, query_params) in queries.items()
+    }
+    sections = {name: future.result() for name, future in futures.items()}
+    sections.setdefault("leads_by_agent", "[]")
+
+    return "{" + ",".join(
+        f'"{name}":{sections[name]}'
+        for name in ("leads_by_day", "leads_by_timeline", "leads_by_price", "leads_by_site", "leads_by_agent", "sync_stats")
+    ) + "}"
 
 def _parse_report_dates(start_date: str, end_date: str) -> tuple[str, str]:
     """Validate and normalize report date inputs (YYYY-MM-DD)."""
@@ -1938,10 +2392,10 @@ def get_visitor_report(
     """Return printable visitor report data for a date range with per-site breakdowns."""
     start, end = _parse_report_dates(start_date, end_date)
 
-    with get_db() as conn:
+    with get_db(readonly=True) as conn:
         cursor = conn.cursor()
 
-        where_clauses = ["DATE(v.created_at) >= ?", "DATE(v.created_at) <= ?"]
+        where_clauses = ["v.created_at >= ?", "v.created_at < DATE(?, '+1 day')"]
         params: List = [start, end]
 
         if current_user.role == "user":
@@ -2186,32 +2640,48 @@ def get_visitor_report(
 def initialize_super_admin():
     """Initialize or update super admin user on startup"""
     try:
-        with get_db() as conn:
-            cursor = conn.cursor()
-
-            # Check if super admin exists
-            existing = cursor.execute(
-                "SELECT id FROM users WHERE username = ?",
+        with get_db(readonly=True) as conn:
+            existing = conn.execute(
+                "SELECT id, password_hash, email, role, active FROM users WHERE username = ?",
                 (SUPER_ADMIN_USERNAME,)
             ).fetchone()
 
-            password_hash = get_password_hash(SUPER_ADMIN_PASSWORD)
+        if existing:
+            # One verify instead of a fresh hash + write on every boot; the
+            # hash is only replaced when the password changed or the scheme
+            # is deprecated
+            valid, new_hash = get_pwd_context().verify_and_update(
+                SUPER_ADMIN_PASSWORD, existing["password_hash"]
+            )
+            unchanged = (
+                valid and new_hash is None
+                and existing["email"] == SUPER_ADMIN_EMAIL
+                and existing["role"] == "super_admin"
+                and existing["active"]
+            )
+            if unchanged:
+                return
 
-            if existing:
-                # Update existing super admin
-                cursor.execute("""
+            password_hash = new_hash or (existing["password_hash"] if valid else get_password_hash(SUPER_ADMIN_PASSWORD))
+
+            # Update existing super admin
+            with get_db() as conn:
+                conn.execute("""
                     UPDATE users
                     SET password_hash = ?, email = ?, role = 'super_admin', active = 1
                     WHERE username = ?
                 """, (password_hash, SUPER_ADMIN_EMAIL, SUPER_ADMIN_USERNAME))
-                print(f"✅ Super admin '{SUPER_ADMIN_USERNAME}' updated")
-            else:
-                # Create new super admin
-                cursor.execute("""
+            print(f"✅ Super admin '{SUPER_ADMIN_USERNAME}' updated")
+        else:
+            password_hash = get_password_hash(SUPER_ADMIN_PASSWORD)
+
+            # Create new super admin
+            with get_db() as conn:
+                conn.execute("""
                     INSERT INTO users (username, password_hash, email, role, agent_id, active)
                     VALUES (?, ?, ?, 'super_admin', NULL, 1)
                 """, (SUPER_ADMIN_USERNAME, password_hash, SUPER_ADMIN_EMAIL))
-                print(f"✅ Super admin '{SUPER_ADMIN_USERNAME}' created")
+            print(f"✅ Super admin '{SUPER_ADMIN_USERNAME}' created")
 
     except Exception as e:
         print(f"❌ Error initializing super admin: {e}")
@@ -2220,4 +2690,17 @@ def initialize_super_admin():
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    # Apply the schema once here, before the workers start, so a slow upgrade
+    # (FTS rebuild, counter recount) never has workers waiting on its lock
+    apply_schema()
+    WRITE_POOL.close()
+    # uvloop/httptools ship with uvicorn[standard]; each worker is its own
+    # process with its own connection pools and caches
+    uvicorn.run(
+        "main:app",
+        host="0.0.0.0",
+        port=8000,
+        loop="uvloop",
+        http="httptools",
+        workers=int(os.getenv("WEB_CONCURRENCY", os.cpu_count() or 1))
+    )
@@ -119,10 +119,79 @@ CREATE INDEX IF NOT EXISTS idx_users_username ON users(username);
 CREATE INDEX IF NOT EXISTS idx_users_agent_id ON users(agent_id);
 CREATE INDEX IF NOT EXISTS idx_visitors_phone ON visitors(buyer_phone);
 CREATE INDEX IF NOT EXISTS idx_visitors_email ON visitors(buyer_email);
-CREATE INDEX IF NOT EXISTS idx_visitors_site ON visitors(site);
 CREATE INDEX IF NOT EXISTS idx_visitors_created ON visitors(created_at);
-CREATE INDEX IF NOT EXISTS idx_visitor_notes_visitor ON visitor_notes(visitor_id);
-CREATE INDEX IF NOT EXISTS idx_visitors_capturing_agent ON visitors(capturing_agent_id);
+
+-- Composite indexes matching the list/export/stats filters (site, agent) + ORDER BY created_at
+CREATE INDEX IF NOT EXISTS idx_visitors_site_agent_created ON visitors(site, capturing_agent_id, created_at DESC);
+CREATE INDEX IF NOT EXISTS idx_visitors_agent_created ON visitors(capturing_agent_id, created_at DESC);
+CREATE INDEX IF NOT EXISTS idx_visitors_cinc_synced ON visitors(cinc_synced, capturing_agent_id);
+CREATE INDEX IF NOT EXISTS idx_visitor_notes_visitor_created ON visitor_notes(visitor_id, created_at DESC);
+
+-- Admin views filtered by site alone, ordered or grouped by site
+CREATE INDEX IF NOT EXISTS idx_visitors_site_created ON visitors(site, created_at DESC);
+
+-- Analytics leads-by-day groups on DATE(created_at); an expression index lets
+-- the GROUP BY walk the index in order instead of sorting every row
+CREATE INDEX IF NOT EXISTS idx_visitors_created_date ON visitors(DATE(created_at));
+
+-- Superseded by the composite indexes above (same leading column)
+DROP INDEX IF EXISTS idx_visitors_site;
+DROP INDEX IF EXISTS idx_visitors_capturing_agent;
+DROP INDEX IF EXISTS idx_visitor_notes_visitor;
+
+-- Redundant with the UNIQUE(username) autoindex the user lookups seek by
+DROP INDEX IF EXISTS idx_users_username_active;
+
+-- Full-text index for the visitor list search box. The trigram tokenizer
+-- matches any substring of 3+ characters, the same results as LIKE '%term%'.
+CREATE VIRTUAL TABLE IF NOT EXISTS visitors_fts USING fts5(
+    buyer_name,
+    buyer_phone,
+    buyer_email,
+    content='visitors',
+    content_rowid='id',
+    tokenize='trigram'
+);
+
+-- Keep visitors_fts in sync with the searchable visitor columns
+CREATE TRIGGER IF NOT EXISTS visitors_fts_insert AFTER INSERT ON visitors BEGIN
+    INSERT INTO visitors_fts(rowid, buyer_name, buyer_phone, buyer_email)
+    VALUES (new.id, new.buyer_name, new.buyer_phone, new.buyer_email);
+END;
+
+CREATE TRIGGER IF NOT EXISTS visitors_fts_delete AFTER DELETE ON visitors BEGIN
+    INSERT INTO visitors_fts(visitors_fts, rowid, buyer_name, buyer_phone, buyer_email)
+    VALUES ('delete', old.id, old.buyer_name, old.buyer_phone, old.buyer_email);
+END;
+
+CREATE TRIGGER IF NOT EXISTS visitors_fts_update AFTER UPDATE OF buyer_name, buyer_phone, buyer_email ON visitors BEGIN
+    INSERT INTO visitors_fts(visitors_fts, rowid, buyer_name, buyer_phone, buyer_email)
+    VALUES ('delete', old.id, old.buyer_name, old.buyer_phone, old.buyer_email);
+    INSERT INTO visitors_fts(rowid, buyer_name, buyer_phone, buyer_email)
+    VALUES (new.id, new.buyer_name, new.buyer_phone, new.buyer_email);
+END;
+
+-- Index visitors that existed before visitors_fts was added
+INSERT INTO visitors_fts(visitors_fts) VALUES ('rebuild');
+
+-- Row counts kept up to date by triggers, so unfiltered totals are a
+-- single-row lookup instead of a count over the whole table
+CREATE TABLE IF NOT EXISTS counters (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+
+CREATE TRIGGER IF NOT EXISTS visitors_count_insert AFTER INSERT ON visitors BEGIN
+    INSERT INTO counters(name, value) VALUES ('visitors', 1)
+    ON CONFLICT(name) DO UPDATE SET value = value + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS visitors_count_delete AFTER DELETE ON visitors BEGIN
+    UPDATE counters SET value = value - 1 WHERE name = 'visitors';
+END;
+
+-- Recount whenever the schema is applied
+INSERT OR REPLACE INTO counters(name, value) SELECT 'visitors', COUNT(*) FROM visitors;
 
 -- View for easy querying
 CREATE VIEW IF NOT EXISTS visitor_details AS
@@ -134,3 +203,6 @@ SELECT
     (SELECT note FROM visitor_notes WHERE visitor_id = v.id ORDER BY created_at DESC LIMIT 1) as latest_note
 FROM visitors v
 LEFT JOIN agents a ON v.capturing_agent_id = a.id;
+
+-- Schema version checked on startup (keep in sync with SCHEMA_VERSION in main.py)
+PRAGMA user_version = 5;
@@ -0,0 +1,65 @@
+"""
+Shared connection setup for the migrate_*.py and import_*.py scripts
+"""
+
+import sqlite3
+import os
+
+DATABASE_PATH = os.getenv("DATABASE_PATH", "/data/leads.db")
+
+# Same tuning the API applies. Under WAL the dashboard keeps reading while
+# a migration or import holds the write lock; the longer busy_timeout lets
+# the script wait out the app's writes instead of failing with "database is
+# locked".
+SQLITE_PRAGMAS = """
+    PRAGMA journal_mode = WAL;
+    PRAGMA synchronous = NORMAL;
+    PRAGMA busy_timeout = 60000;
+    PRAGMA cache_size = -20000;
+    PRAGMA mmap_size = 268435456;
+    PRAGMA temp_store = MEMORY;
+"""
+
+def open_conn(database_path=DATABASE_PATH):
+    """Open a script connection with the PRAGMAs applied.
+
+    Autocommit mode: the script manages its own single transaction, so the
+    DDL runs inside it too instead of committing statement by statement.
+    """
+    conn = sqlite3.connect(database_path, isolation_level=None, timeout=60)
+    conn.executescript(SQLITE_PRAGMAS)
+    return conn
+
+def finish_migration(conn):
+    """Last statements of a migration transaction that rebuilt a table, just before COMMIT.
+
+    Rebuilding a table drops the indexes and triggers schema.sql added to it,
+    so user_version is reset and the API reapplies schema.sql (and refreshes
+    statistics) on its next start. ANALYZE gives the reshaped tables real
+    statistics right away; query plans after a migration may differ from the
+    ones before it.
+    """
+    conn.execute("ANALYZE")
+    conn.execute("PRAGMA user_version = 0")
+
+def run_migrations(*migrations):
+    """Run migration steps on one connection inside one BEGIN IMMEDIATE transaction.
+
+    Each step returns True if it rebuilt a table and False if there was
+    nothing to rebuild. finish_migration only runs when some step rebuilt a
+    table, so re-running on a migrated database leaves user_version alone.
+    Any error rolls back every step.
+    """
+    conn = open_conn()
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        rebuilt = [migration(conn) for migration in migrations]
+        if any(rebuilt):
+            finish_migration(conn)
+        conn.execute("COMMIT")
+    except BaseException:
+        if conn.in_transaction:
+            conn.execute("ROLLBACK")
+        raise
+    finally:
+        conn.close()
@@ -9,11 +9,49 @@ import sqlite3
 import sys
 import os
 
+from _migrate_common import open_conn
+
 # Configuration
 GOOGLE_SHEET_KEY = os.getenv("GOOGLE_SHEET_KEY", "YOUR_SHEET_KEY_HERE")
 WORKSHEET_NAME = os.getenv("WORKSHEET_NAME", "Agents")
 DATABASE_PATH = os.getenv("DATABASE_PATH", "leads.db")
 
+AGENT_UPSERT_SQL = """
+    INSERT INTO agents (name, cinc_id, email, phone)
+    VALUES (?, ?, ?, ?)
+    ON CONFLICT(cinc_id) DO UPDATE SET
+        name = excluded.name,
+        email = excluded.email,
+        phone = excluded.phone
+"""
+
+# Accepted header names per field, in order of preference. Sites can be
+# comma-separated for multiple sites.
+FIELD_HEADERS = {
+    'agent_name': ('site_agent_name',),
+    'cinc_id': ('agent_mdid',),
+    'sites': ('site', 'Site', 'sites', 'Sites'),
+    'email': ('site_agent_email', 'Email', 'email'),
+    'phone': ('Phone', 'phone'),
+}
+
+def compile_field_columns(headers):
+    """Map each field to the positions of its headers present in the sheet"""
+    positions = {header: i for i, header in enumerate(headers)}
+    return {
+        field: [positions[h] for h in names if h in positions]
+        for field, names in FIELD_HEADERS.items()
+    }
+
+def read_field(row, indexes):
+    """First non-empty stripped cell among a field's columns, '' if none"""
+    for i in indexes:
+        if i < len(row):
+            value = row[i].strip()
+            if value:
+                return value
+    return ''
+
 # Expected columns in Google Sheet:
 # site_agent_name | agent_mdid | Site | Email | Phone
 
@@ -50,26 +88,32 @@ def import_agents():
         print("Connecting to Google Sheets...")
         worksheet = connect_to_sheet()
         
-        # Get all records
-        records = worksheet.get_all_records()
-        print(f"Found {len(records)} agents in sheet")
+        # Raw cell values - no dict per row; the header row is resolved to
+        # column positions once
+        values = worksheet.get_all_values()
+        headers, rows = (values[0], values[1:]) if values else ([], [])
+        columns = compile_field_columns(headers)
+        print(f"Found {len(rows)} agents in sheet")
         
         # Connect to database
-        conn = sqlite3.connect(DATABASE_PATH)
+        conn = open_conn(DATABASE_PATH)
         cursor = conn.cursor()
         
         imported = 0
         skipped = 0
-        
-        for record in records:
+
+        # cinc_id -> (agent row, sites); a later row for the same agent
+        # replaces the earlier one and takes its place in sheet order, so the
+        # batch applies rows in the order they did one by one
+        agents = {}
+
+        for row in rows:
             try:
-                agent_name = record.get('site_agent_name', '').strip()
-                cinc_id = record.get('agent_mdid', '').strip()
-                # Try both 'site' and 'Site' column names - can be comma-separated for multiple sites
-                sites_str = record.get('site', '').strip() or record.get('Site', '').strip() or record.get('sites', '').strip() or record.get('Sites', '').strip()
-                # Try various email column names
-                email = record.get('site_agent_email', '').strip() or record.get('Email', '').strip() or record.get('email', '').strip()
-                phone = record.get('Phone', '').strip() or record.get('phone', '').strip()
+                agent_name = read_field(row, columns['agent_name'])
+                cinc_id = read_field(row, columns['cinc_id'])
+                sites_str = read_field(row, columns['sites'])
+                email = read_field(row, columns['email'])
+                phone = read_field(row, columns['phone'])
 
                 if not agent_name or not cinc_id:
                     print(f"Skipping incomplete record (missing required fields): agent_name='{agent_name}', cinc_id='{cinc_id}'")
@@ -80,43 +124,57 @@ def import_agents():
                 # If no sites provided, agent will be created without site assignments
                 sites = [s.strip() for s in sites_str.split(',') if s.strip()] if sites_str else []
 
-                # Insert or update agent
-                cursor.execute("""
-                    INSERT INTO agents (name, cinc_id, email, phone)
-                    VALUES (?, ?, ?, ?)
-                    ON CONFLICT(cinc_id) DO UPDATE SET
-                        name = excluded.name,
-                        email = excluded.email,
-                        phone = excluded.phone
-                """, (agent_name, cinc_id, email or None, phone or None))
-
-                # Get agent_id (either newly inserted or existing)
-                cursor.execute("SELECT id FROM agents WHERE cinc_id = ?", (cinc_id,))
-                agent_id = cursor.fetchone()[0]
-
-                # Clear existing site assignments for this agent (we'll re-add them)
-                cursor.execute("DELETE FROM agent_sites WHERE agent_id = ?", (agent_id,))
-
-                # Add site assignments
-                sites_added = 0
-                if sites:
-                    for site in sites:
-                        cursor.execute("""
-                            INSERT OR IGNORE INTO agent_sites (agent_id, site)
-                            VALUES (?, ?)
-                        """, (agent_id, site))
-                        sites_added += 1
-
-                    print(f"✓ Imported: {agent_name} ({sites_added} site(s): {', '.join(sites)})")
-                else:
-                    print(f"✓ Imported: {agent_name} (no sites assigned)")
-
-                imported += 1
+                agents.pop(cinc_id, None)
+                agents[cinc_id] = ((agent_name, cinc_id, email or None, phone or None), sites)
 
             except Exception as e:
-                print(f"Error importing {record}: {e}")
+                print(f"Error importing {row}: {e}")
                 skipped += 1
-        
+
+        # One write transaction for the whole sheet
+        cursor.execute("BEGIN IMMEDIATE")
+
+        # Insert or update every agent in one executemany; if any row fails,
+        # replay row by row so only the bad agents are skipped
+        cursor.execute("SAVEPOINT agent_batch")
+        try:
+            cursor.executemany(AGENT_UPSERT_SQL, [row for row, _ in agents.values()])
+            cursor.execute("RELEASE agent_batch")
+        except sqlite3.Error:
+            cursor.execute("ROLLBACK TO agent_batch")
+            cursor.execute("RELEASE agent_batch")
+            for cinc_id, (row, _) in list(agents.items()):
+                try:
+                    cursor.execute(AGENT_UPSERT_SQL, row)
+                except sqlite3.Error as e:
+                    print(f"Error importing {row[0]}: {e}")
+                    del agents[cinc_id]
+                    skipped += 1
+
+        # Resolve agent ids (newly inserted or existing) in one query
+        agent_ids = {
+            cinc_id: agent_id
+            for agent_id, cinc_id in cursor.execute("SELECT id, cinc_id FROM agents")
+            if cinc_id in agents
+        }
+
+        # Replace each imported agent's site assignments
+        cursor.executemany(
+            "DELETE FROM agent_sites WHERE agent_id = ?",
+            [(agent_ids[cinc_id],) for cinc_id in agents]
+        )
+        cursor.executemany(
+            "INSERT OR IGNORE INTO agent_sites (agent_id, site) VALUES (?, ?)",
+            [(agent_ids[cinc_id], site) for cinc_id, (_, sites) in agents.items() for site in sites]
+        )
+
+        for (agent_name, *_), sites in agents.values():
+            if sites:
+                print(f"✓ Imported: {agent_name} ({len(sites)} site(s): {', '.join(sites)})")
+            else:
+                print(f"✓ Imported: {agent_name} (no sites assigned)")
+            imported += 1
+
         conn.commit()
         conn.close()
         
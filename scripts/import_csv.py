@@ -8,12 +8,64 @@ import sys
 import os
 from pathlib import Path
 
+from _migrate_common import open_conn
+
 # Database path - use environment variable or default to Docker path
 DB_PATH = os.environ.get('DATABASE_PATH', '/data/leads.db')
 
+VISITOR_INSERT_SQL = """
+    INSERT INTO visitors (
+        buyer_name, buyer_phone, buyer_email, first_visit,
+        interested_in, purchase_timeline, represented, cobroker_name,
+        is_local, buyer_state, occupation, occupation_other,
+        discovery_method, builders_requested, offer_on_table,
+        finalized_contracts, notes, price_range, location_looking,
+        location_current, capturing_agent_id, site, created_at,
+        cinc_synced, cinc_sync_at, cinc_lead_id
+    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+def parse_bool(val):
+    """Parse a CSV boolean cell into 0/1"""
+    if val in ('1', 'True', 'true', '1.0'):
+        return 1
+    return 0
+
+# Visitors are inserted with executemany in batches of this many rows
+BATCH_SIZE = 1000
+
+def flush_visitors(cursor, batch, stats):
+    """Insert a batch of (label, values) visitor rows.
+
+    The batch runs under a savepoint; if any row fails, the batch is rolled
+    back and retried row by row so only the bad rows are reported and skipped.
+    """
+    cursor.execute("SAVEPOINT visitor_batch")
+    try:
+        cursor.executemany(VISITOR_INSERT_SQL, [values for _, values in batch])
+        cursor.execute("RELEASE visitor_batch")
+    except sqlite3.Error:
+        cursor.execute("ROLLBACK TO visitor_batch")
+        cursor.execute("RELEASE visitor_batch")
+        for label, values in batch:
+            try:
+                cursor.execute(VISITOR_INSERT_SQL, values)
+            except sqlite3.Error as e:
+                error_msg = f"Error importing {label}: {str(e)}"
+                stats['errors'].append(error_msg)
+                print(f"✗ {error_msg}")
+                continue
+            stats['visitors_created'] += 1
+            print(f"✓ Imported: {label}")
+        return
+
+    stats['visitors_created'] += len(batch)
+    for label, _ in batch:
+        print(f"✓ Imported: {label}")
+
 def import_csv(csv_path):
     """Import visitors from CSV file"""
-    conn = sqlite3.connect(DB_PATH)
+    conn = open_conn(DB_PATH)
     conn.row_factory = sqlite3.Row
     cursor = conn.cursor()
 
@@ -25,6 +77,13 @@ def import_csv(csv_path):
         'errors': []
     }
 
+    # cinc_id -> agent id, so each agent is looked up at most once per file
+    agent_ids = {}
+    batch = []
+
+    # One write transaction for the whole file
+    cursor.execute("BEGIN IMMEDIATE")
+
     # Read CSV
     with open(csv_path, 'r', encoding='utf-8') as f:
         reader = csv.DictReader(f)
@@ -37,86 +96,72 @@ def import_csv(csv_path):
                 agent_cinc_id = row.get('agent_cinc_id')
 
                 if agent_name and agent_cinc_id:
-                    # Check if agent exists
-                    existing = cursor.execute(
-                        "SELECT id FROM agents WHERE cinc_id = ?",
-                        (agent_cinc_id,)
-                    ).fetchone()
-
-                    if not existing:
-                        # Create agent
-                        cursor.execute("""
-                            INSERT INTO agents (name, cinc_id, active)
-                            VALUES (?, ?, 1)
-                        """, (agent_name, agent_cinc_id))
-                        stats['agents_created'] += 1
-                        print(f"✓ Created agent: {agent_name}")
-
-                    # Get agent ID
-                    agent = cursor.execute(
-                        "SELECT id FROM agents WHERE cinc_id = ?",
-                        (agent_cinc_id,)
-                    ).fetchone()
-                    capturing_agent_id = agent['id']
+                    capturing_agent_id = agent_ids.get(agent_cinc_id)
+                    if capturing_agent_id is None:
+                        existing = cursor.execute(
+                            "SELECT id FROM agents WHERE cinc_id = ?",
+                            (agent_cinc_id,)
+                        ).fetchone()
+
+                        if existing:
+                            capturing_agent_id = existing['id']
+                        else:
+                            # Create agent
+                            capturing_agent_id = cursor.execute("""
+                                INSERT INTO agents (name, cinc_id, active)
+                                VALUES (?, ?, 1)
+                                RETURNING id
+                            """, (agent_name, agent_cinc_id)).fetchone()['id']
+                            stats['agents_created'] += 1
+                            print(f"✓ Created agent: {agent_name}")
+
+                        agent_ids[agent_cinc_id] = capturing_agent_id
                 else:
                     print(f"⚠ Skipping row - missing agent info: {row.get('buyer_name')}")
                     stats['visitors_skipped'] += 1
                     continue
 
-                # Parse boolean values
-                def parse_bool(val):
-                    if val in ('1', 'True', 'true', '1.0'):
-                        return 1
-                    return 0
-
-                # Insert visitor
-                cursor.execute("""
-                    INSERT INTO visitors (
-                        buyer_name, buyer_phone, buyer_email, first_visit,
-                        interested_in, purchase_timeline, represented, cobroker_name,
-                        is_local, buyer_state, occupation, occupation_other,
-                        discovery_method, builders_requested, offer_on_table,
-                        finalized_contracts, notes, price_range, location_looking,
-                        location_current, capturing_agent_id, site, created_at,
-                        cinc_synced, cinc_sync_at, cinc_lead_id
-                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                """, (
+                batch.append((f"{row.get('buyer_name')} ({row.get('site')})", (
                     row.get('buyer_name'),
-                    row.get('buyer_phone') if row.get('buyer_phone') else None,
+                    row.get('buyer_phone') or None,
                     row.get('buyer_email') if row.get('buyer_email') not in ('', 'None@gmail.com') else None,
                     parse_bool(row.get('first_visit', '1')),
-                    row.get('interested_in') if row.get('interested_in') else None,
-                    row.get('purchase_timeline') if row.get('purchase_timeline') else None,
+                    row.get('interested_in') or None,
+                    row.get('purchase_timeline') or None,
                     parse_bool(row.get('represented', '0')),
-                    row.get('cobroker_name') if row.get('cobroker_name') else None,
+                    row.get('cobroker_name') or None,
                     parse_bool(row.get('is_local', '1')),
-                    row.get('buyer_state') if row.get('buyer_state') else None,
-                    row.get('occupation') if row.get('occupation') else None,
-                    row.get('occupation_other') if row.get('occupation_other') else None,
-                    row.get('discovery_method') if row.get('discovery_method') else None,
-                    row.get('builders_requested') if row.get('builders_requested') else None,
+                    row.get('buyer_state') or None,
+                    row.get('occupation') or None,
+                    row.get('occupation_other') or None,
+                    row.get('discovery_method') or None,
+                    row.get('builders_requested') or None,
                     parse_bool(row.get('offer_on_table', '0')),
                     parse_bool(row.get('finalized_contracts', '0')),
-                    row.get('notes') if row.get('notes') else None,
-                    row.get('price_range') if row.get('price_range') else None,
-                    row.get('location_looking') if row.get('location_looking') else None,
-                    row.get('location_current') if row.get('location_current') else None,
+                    row.get('notes') or None,
+                    row.get('price_range') or None,
+                    row.get('location_looking') or None,
+                    row.get('location_current') or None,
                     capturing_agent_id,
                     row.get('site'),
                     row.get('created_at'),
                     parse_bool(row.get('cinc_synced', '0')),
-                    row.get('cinc_sync_at') if row.get('cinc_sync_at') else None,
-                    row.get('cinc_lead_id') if row.get('cinc_lead_id') else None
-                ))
+                    row.get('cinc_sync_at') or None,
+                    row.get('cinc_lead_id') or None
+                )))
 
-                stats['visitors_created'] += 1
-                print(f"✓ Imported: {row.get('buyer_name')} ({row.get('site')})")
+                if len(batch) >= BATCH_SIZE:
+                    flush_visitors(cursor, batch, stats)
+                    batch.clear()
 
             except Exception as e:
                 error_msg = f"Error importing {row.get('buyer_name', 'Unknown')}: {str(e)}"
                 stats['errors'].append(error_msg)
                 print(f"✗ {error_msg}")
 
+    if batch:
+        flush_visitors(cursor, batch, stats)
+
     conn.commit()
     conn.close()
 
@@ -3,30 +3,50 @@
 Database migration script to convert agents table to many-to-many with sites
 """
 
-import sqlite3
-import os
+import json
 
-DATABASE_PATH = os.getenv("DATABASE_PATH", "/data/leads.db")
+from _migrate_common import run_migrations
 
-def migrate():
+def migrate(conn):
     """Migrate agents table to support many-to-many relationship with sites"""
-    conn = sqlite3.connect(DATABASE_PATH)
-    cursor = conn.cursor()
-
     print("Starting migration of agents table to many-to-many with sites...")
 
     try:
+        cursor = conn.cursor()
+
         # Check if migration has already been completed by checking if agents table still has 'site' column
         cursor.execute("PRAGMA table_info(agents)")
         columns = [row[1] for row in cursor.fetchall()]
         if 'site' not in columns:
             print("✓ Migration already completed (agents table does not have 'site' column)")
-            return
+            return False
 
-        # Get existing agents data
-        cursor.execute("SELECT id, name, cinc_id, site, email, phone, active, created_at FROM agents")
-        existing_agents = cursor.fetchall()
-        print(f"Found {len(existing_agents)} existing agent records...")
+        # Get existing agents data grouped by name in SQLite. Bare columns
+        # next to MIN(id) come from each name's first row, and the id/site
+        # arrays keep row order.
+        agent_map = {}  # Map of name -> (cinc_id, email, phone, active, created_at, [sites])
+        existing_count = 0
+
+        for name, _, cinc_id, email, phone, active, created_at, old_ids, sites in cursor.execute("""
+            SELECT name, MIN(id), cinc_id, email, phone, active, created_at,
+                   json_group_array(id), json_group_array(site)
+            FROM (SELECT * FROM agents ORDER BY id)
+            GROUP BY name
+            ORDER BY MIN(id)
+        """):
+            entry = {
+                'cinc_id': cinc_id,
+                'email': email,
+                'phone': phone,
+                'active': active,
+                'created_at': created_at,
+                'sites': json.loads(sites),
+                'old_ids': json.loads(old_ids)
+            }
+            agent_map[name] = entry
+            existing_count += len(entry['old_ids'])
+
+        print(f"Found {existing_count} existing agent records...")
 
         # Create new agents table without site column
         cursor.execute("""
@@ -55,56 +75,79 @@ def migrate():
         """)
         print("Created agent_sites junction table...")
 
-        # Migrate data - group agents by name and combine sites
-        agent_map = {}  # Map of name -> (cinc_id, email, phone, active, created_at, [sites])
-
-        for old_id, name, cinc_id, site, email, phone, active, created_at in existing_agents:
-            if name not in agent_map:
-                agent_map[name] = {
-                    'cinc_id': cinc_id,
-                    'email': email,
-                    'phone': phone,
-                    'active': active,
-                    'created_at': created_at,
-                    'sites': [],
-                    'old_ids': []
-                }
-            agent_map[name]['sites'].append(site)
-            agent_map[name]['old_ids'].append(old_id)
+        # Names are already unique, but two names can share a cinc_id. The
+        # later name wins, as INSERT OR REPLACE used to decide, so resolve that
+        # here and insert with a plain INSERT - no delete + reinsert per clash.
+        agent_rows = {}  # Map of cinc_id -> agents_new row
+        for name, data in agent_map.items():
+            agent_rows.pop(data['cinc_id'], None)
+            agent_rows[data['cinc_id']] = (
+                name, data['cinc_id'], data['email'], data['phone'], data['active'], data['created_at']
+            )
 
         # Insert unique agents
+        cursor.executemany("""
+            INSERT INTO agents_new (name, cinc_id, email, phone, active, created_at)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, agent_rows.values())
+
+        # lastrowid is not available per row after executemany - read the new
+        # ids back in one query
+        name_to_id = {}
+        cinc_to_id = {}
+        for new_id, name, cinc_id in cursor.execute("SELECT id, name, cinc_id FROM agents_new"):
+            name_to_id[name] = new_id
+            cinc_to_id[cinc_id] = new_id
+
         new_agent_id_map = {}  # Map old_id -> new_id
+        site_rows = []
+        progress = []  # Per-agent lines, printed in one write after the loop
         for name, data in agent_map.items():
-            cursor.execute("""
-                INSERT OR REPLACE INTO agents_new (name, cinc_id, email, phone, active, created_at)
-                VALUES (?, ?, ?, ?, ?, ?)
-            """, (name, data['cinc_id'], data['email'], data['phone'], data['active'], data['created_at']))
-
-            new_id = cursor.lastrowid
+            new_id = name_to_id.get(name)
+            if new_id is None:
+                # Lost its cinc_id to a later name and has no row of its own.
+                # Its old ids still have to be remapped - the new ids are
+                # dense, so a stale old id would point at some other agent.
+                for old_id in data['old_ids']:
+                    new_agent_id_map[old_id] = cinc_to_id[data['cinc_id']]
+                winner = agent_rows[data['cinc_id']][0]
+                progress.append(
+                    f"↪ Merged: {name} into {winner} (shared cinc_id {data['cinc_id']}; "
+                    f"{len(data['sites'])} site(s) dropped)"
+                )
+                continue
             for old_id in data['old_ids']:
                 new_agent_id_map[old_id] = new_id
+            site_rows.extend((new_id, site) for site in data['sites'])
+            progress.append(f"✓ Migrated: {name} ({len(data['sites'])} site(s))")
 
-            # Insert agent-site relationships
-            for site in data['sites']:
-                cursor.execute("""
-                    INSERT OR IGNORE INTO agent_sites (agent_id, site)
-                    VALUES (?, ?)
-                """, (new_id, site))
-
-            print(f"✓ Migrated: {name} ({len(data['sites'])} site(s))")
-
-        print(f"Migrated {len(agent_map)} unique agents...")
-
-        # Update users table - map old agent_id to new agent_id
-        cursor.execute("SELECT id, agent_id FROM users WHERE agent_id IS NOT NULL")
-        users_to_update = cursor.fetchall()
+        if progress:
+            print("\n".join(progress))
 
-        for user_id, old_agent_id in users_to_update:
-            if old_agent_id in new_agent_id_map:
-                new_id = new_agent_id_map[old_agent_id]
-                cursor.execute("UPDATE users SET agent_id = ? WHERE id = ?", (new_id, user_id))
+        # Insert agent-site relationships - one statement over a JSON array of
+        # [agent_id, site] pairs, fanned out by json_each inside SQLite
+        cursor.execute("""
+            INSERT OR IGNORE INTO agent_sites (agent_id, site)
+            SELECT value ->> '$[0]', value ->> '$[1]'
+            FROM json_each(?)
+        """, (json.dumps(site_rows),))
+        sites_inserted = cursor.rowcount
+
+        print(f"Migrated {len(agent_rows)} unique agents...")
+
+        # Update users table - map old agent_id to new agent_id through a
+        # temp table, so every user is remapped by a single UPDATE
+        cursor.execute("CREATE TEMP TABLE agent_id_map (old_id INTEGER PRIMARY KEY, new_id INTEGER NOT NULL)")
+        cursor.executemany("INSERT INTO agent_id_map (old_id, new_id) VALUES (?, ?)", new_agent_id_map.items())
+        cursor.execute("""
+            UPDATE users
+            SET agent_id = (SELECT new_id FROM agent_id_map WHERE old_id = users.agent_id)
+            WHERE agent_id IN (SELECT old_id FROM agent_id_map)
+        """)
+        users_updated = cursor.rowcount
+        cursor.execute("DROP TABLE agent_id_map")
 
-        print(f"Updated {len(users_to_update)} user agent references...")
+        print(f"Updated {users_updated} user agent references...")
 
         # Drop the visitor_details view that depends on agents table
         cursor.execute("DROP VIEW IF EXISTS visitor_details")
@@ -139,17 +182,14 @@ def migrate():
         """)
         print("Recreated visitor_details view...")
 
-        conn.commit()
         print("\n✓ Migration completed successfully!")
-        print(f"  - {len(agent_map)} unique agents")
-        print(f"  - {sum(len(data['sites']) for data in agent_map.values())} agent-site relationships")
+        print(f"  - {len(agent_rows)} unique agents")
+        print(f"  - {sites_inserted} agent-site relationships")
+        return True
 
     except Exception as e:
-        conn.rollback()
         print(f"✗ Migration failed: {e}")
         raise
-    finally:
-        conn.close()
 
 if __name__ == "__main__":
-    migrate()
+    run_migrations(migrate)
@@ -0,0 +1,32 @@
+#!/usr/bin/env python3
+"""
+Run every migration in dependency order on one connection and one transaction
+"""
+
+from _migrate_common import run_migrations
+import migrate_users
+import migrate_visitors
+import migrate_agents_sites
+import migrate_notes
+
+# users first (agents_sites remaps users.agent_id), visitors before
+# agents_sites (which recreates the view over the new visitors table), and
+# notes last (it reads visitors.notes)
+MIGRATIONS = [
+    migrate_users.migrate,
+    migrate_visitors.migrate,
+    migrate_agents_sites.migrate,
+    migrate_notes.migrate_notes,
+]
+
+def migrate_all():
+    """Apply all migrations atomically - either every step commits or none do"""
+    try:
+        run_migrations(*MIGRATIONS)
+    except BaseException:
+        print("✗ Migrations rolled back")
+        raise
+    print("\n✓ All migrations committed")
+
+if __name__ == "__main__":
+    migrate_all()
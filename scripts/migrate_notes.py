@@ -2,63 +2,53 @@
 """
 Migrate existing notes from visitors.notes field to visitor_notes table
 """
-import sqlite3
-import os
+from _migrate_common import run_migrations
 
-DB_PATH = os.environ.get('DATABASE_PATH', '/data/leads.db')
+# visitors.notes with the same surrounding whitespace str.strip() removes
+TRIMMED_NOTES = "TRIM(v.notes, ' ' || char(9, 10, 11, 12, 13))"
 
-def migrate_notes():
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
+def migrate_notes(conn):
     cursor = conn.cursor()
 
-    # Find all visitors with notes that aren't already in visitor_notes
-    visitors_with_notes = cursor.execute("""
-        SELECT id, notes, capturing_agent_id, created_at
-        FROM visitors
-        WHERE notes IS NOT NULL
-        AND notes != ''
-        AND TRIM(notes) != ''
-    """).fetchall()
-
-    print(f"Found {len(visitors_with_notes)} visitors with notes in the notes field")
-
-    migrated = 0
-    skipped = 0
-
-    for visitor in visitors_with_notes:
-        visitor_id = visitor['id']
-        note_text = visitor['notes'].strip()
-        agent_id = visitor['capturing_agent_id']
-        created_at = visitor['created_at']
-
-        # Check if this note already exists in visitor_notes
-        existing_note = cursor.execute("""
-            SELECT id FROM visitor_notes
-            WHERE visitor_id = ? AND note = ?
-        """, (visitor_id, note_text)).fetchone()
-
-        if existing_note:
-            print(f"  Visitor {visitor_id}: Note already exists in visitor_notes, skipping")
-            skipped += 1
-            continue
-
-        # Create the note in visitor_notes table with the original visitor creation timestamp
-        cursor.execute("""
-            INSERT INTO visitor_notes (visitor_id, agent_id, note, created_at)
-            VALUES (?, ?, ?, ?)
-        """, (visitor_id, agent_id, note_text, created_at))
-
-        print(f"  Visitor {visitor_id}: Migrated note to visitor_notes")
-        migrated += 1
-
-    conn.commit()
-    conn.close()
+    # Visitors with a non-blank notes field
+    notes_from = f"""
+        FROM visitors v
+        WHERE v.notes IS NOT NULL
+        AND {TRIMMED_NOTES} != ''
+    """
+
+    total = cursor.execute(f"SELECT COUNT(*) {notes_from}").fetchone()[0]
+    print(f"Found {total} visitors with notes in the notes field")
+
+    # Index the duplicate check below. A database that has not had
+    # schema.sql applied yet has no visitor_notes index at all, which makes
+    # the NOT EXISTS a full scan of visitor_notes per visitor. Dropped again
+    # once the copy is done, as the app never looks notes up by text.
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_visitor_notes_vid_note ON visitor_notes(visitor_id, note)")
+
+    # Copy every note not already in visitor_notes in one statement, keeping
+    # the original visitor creation timestamp
+    cursor.execute(f"""
+        INSERT INTO visitor_notes (visitor_id, agent_id, note, created_at)
+        SELECT v.id, v.capturing_agent_id, {TRIMMED_NOTES}, v.created_at
+        {notes_from}
+        AND NOT EXISTS (
+            SELECT 1 FROM visitor_notes vn
+            WHERE vn.visitor_id = v.id
+            AND vn.note = {TRIMMED_NOTES}
+        )
+    """)
+
+    migrated = cursor.rowcount
+    skipped = total - migrated
+
+    cursor.execute("DROP INDEX IF EXISTS idx_visitor_notes_vid_note")
 
     print(f"\nMigration complete!")
     print(f"  Migrated: {migrated}")
     print(f"  Skipped (already exists): {skipped}")
-    print(f"  Total: {len(visitors_with_notes)}")
+    print(f"  Total: {total}")
+    return False
 
 if __name__ == "__main__":
-    migrate_notes()
+    run_migrations(migrate_notes)
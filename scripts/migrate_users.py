@@ -2,16 +2,22 @@
 Migration script to update users table with email column and super_admin role
 """
 
-import sqlite3
-import os
+from _migrate_common import run_migrations
 
-DATABASE_PATH = os.getenv('DATABASE_PATH', '/data/leads.db')
+def migrate(conn):
+    """Rebuild the users table with the email column and super_admin role"""
+    try:
+        cursor = conn.cursor()
 
-def migrate():
-    conn = sqlite3.connect(DATABASE_PATH)
-    cursor = conn.cursor()
+        # Check if migration has already been completed by checking the
+        # users table's CHECK constraint for the super_admin role
+        users_sql = cursor.execute(
+            "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'users'"
+        ).fetchone()[0]
+        if 'super_admin' in users_sql:
+            print("✓ Migration already completed (users table already allows super_admin)")
+            return False
 
-    try:
         # Create new users table with correct schema
         cursor.execute("""
             CREATE TABLE IF NOT EXISTS users_new (
@@ -45,18 +51,14 @@ def migrate():
         cursor.execute("CREATE INDEX IF NOT EXISTS idx_users_username ON users(username)")
         cursor.execute("CREATE INDEX IF NOT EXISTS idx_users_agent_id ON users(agent_id)")
 
-        conn.commit()
         print("✅ Users table migrated successfully!")
         print("   - Added email column")
         print("   - Added super_admin role to CHECK constraint")
+        return True
 
     except Exception as e:
-        conn.rollback()
         print(f"❌ Migration failed: {e}")
         raise
 
-    finally:
-        conn.close()
-
 if __name__ == "__main__":
-    migrate()
+    run_migrations(migrate)
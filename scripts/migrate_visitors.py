@@ -3,19 +3,25 @@
 Database migration script to update visitors table with new fields
 """
 
-import sqlite3
-import os
+from _migrate_common import run_migrations
 
-DATABASE_PATH = os.getenv("DATABASE_PATH", "/data/leads.db")
+# Visitors copied per INSERT ... SELECT window
+COPY_BATCH_SIZE = 5000
 
-def migrate():
+def migrate(conn):
     """Migrate the visitors table to include new fields"""
-    conn = sqlite3.connect(DATABASE_PATH)
-    cursor = conn.cursor()
-
     print("Starting migration of visitors table...")
 
     try:
+        cursor = conn.cursor()
+
+        # Check if migration has already been completed - copying an already
+        # migrated table would drop the new fields' data
+        columns = [row[1] for row in cursor.execute("PRAGMA table_info(visitors)")]
+        if 'first_visit' in columns:
+            print("✓ Migration already completed (visitors table already has the new fields)")
+            return False
+
         # Drop the existing view first (it depends on visitors table)
         cursor.execute("DROP VIEW IF EXISTS visitor_details")
         print("Dropped visitor_details view...")
@@ -86,25 +92,30 @@ def migrate():
 
         print("Created new visitors table...")
 
-        # Copy existing data from old table to new table
-        cursor.execute("""
-            INSERT INTO visitors_new (
-                id, buyer_name, buyer_phone, buyer_email,
-                purchase_timeline, price_range, location_looking,
-                location_current, occupation, represented, agent_name,
-                capturing_agent_id, site, created_at, updated_at,
-                cinc_synced, cinc_sync_at, cinc_lead_id
-            )
-            SELECT
-                id, buyer_name, buyer_phone, buyer_email,
-                purchase_timeline, price_range, location_looking,
-                location_current, occupation, represented, agent_name,
-                capturing_agent_id, site, created_at, updated_at,
-                cinc_synced, cinc_sync_at, cinc_lead_id
-            FROM visitors
-        """)
-
-        rows_copied = cursor.rowcount
+        # Copy existing data from old table to new table in id windows, so no
+        # single statement has to work through the whole table at once
+        min_id, max_id = cursor.execute("SELECT MIN(id), MAX(id) FROM visitors").fetchone()
+        rows_copied = 0
+        if min_id is not None:
+            for lo in range(min_id, max_id + 1, COPY_BATCH_SIZE):
+                cursor.execute("""
+                    INSERT INTO visitors_new (
+                        id, buyer_name, buyer_phone, buyer_email,
+                        purchase_timeline, price_range, location_looking,
+                        location_current, occupation, represented, agent_name,
+                        capturing_agent_id, site, created_at, updated_at,
+                        cinc_synced, cinc_sync_at, cinc_lead_id
+                    )
+                    SELECT
+                        id, buyer_name, buyer_phone, buyer_email,
+                        purchase_timeline, price_range, location_looking,
+                        location_current, occupation, represented, agent_name,
+                        capturing_agent_id, site, created_at, updated_at,
+                        cinc_synced, cinc_sync_at, cinc_lead_id
+                    FROM visitors
+                    WHERE id >= ? AND id < ?
+                """, (lo, lo + COPY_BATCH_SIZE))
+                rows_copied += cursor.rowcount
         print(f"Copied {rows_copied} existing records...")
 
         # Drop old table
@@ -115,12 +126,16 @@ def migrate():
         cursor.execute("ALTER TABLE visitors_new RENAME TO visitors")
         print("Renamed new table to visitors...")
 
-        # Recreate indexes
+        # Recreate the indexes schema.sql defines on visitors (the composite
+        # ones replace the old single-column site and capturing_agent indexes)
         cursor.execute("CREATE INDEX IF NOT EXISTS idx_visitors_phone ON visitors(buyer_phone)")
         cursor.execute("CREATE INDEX IF NOT EXISTS idx_visitors_email ON visitors(buyer_email)")
-        cursor.execute("CREATE INDEX IF NOT EXISTS idx_visitors_site ON visitors(site)")
         cursor.execute("CREATE INDEX IF NOT EXISTS idx_visitors_created ON visitors(created_at)")
-        cursor.execute("CREATE INDEX IF NOT EXISTS idx_visitors_capturing_agent ON visitors(capturing_agent_id)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_visitors_site_agent_created ON visitors(site, capturing_agent_id, created_at DESC)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_visitors_agent_created ON visitors(capturing_agent_id, created_at DESC)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_visitors_cinc_synced ON visitors(cinc_synced, capturing_agent_id)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_visitors_site_created ON visitors(site, created_at DESC)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_visitors_created_date ON visitors(DATE(created_at))")
         print("Recreated indexes...")
 
         # Recreate the visitor_details view
@@ -138,18 +153,15 @@ def migrate():
         """)
         print("Recreated visitor_details view...")
 
-        conn.commit()
         print("✓ Migration completed successfully!")
         print(f"  - {rows_copied} visitor records migrated")
         print("  - New fields added: first_visit, interested_in, cobroker_name, is_local, buyer_state,")
         print("    occupation_other, discovery_method, builders_requested, offer_on_table, finalized_contracts, notes")
+        return True
 
     except Exception as e:
-        conn.rollback()
         print(f"✗ Migration failed: {e}")
         raise
-    finally:
-        conn.close()
 
 if __name__ == "__main__":
-    migrate()
+    run_migrations(migrate)